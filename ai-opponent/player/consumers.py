@@ -6,6 +6,7 @@ import time
 import math
 import websockets
 import json
+import msgpack
 import logging
 import threading
 from channels.generic.websocket import AsyncWebsocketConsumer
@@ -13,6 +14,13 @@ from websockets.exceptions import ConnectionClosedError, InvalidURI, InvalidHand
 
 logger = logging.getLogger(__name__)
 
+# Binary game protocol offered to pong-api, see pong-api/game/protocol.py
+BINARY_SUBPROTOCOL = "pong.msgpack.v2"
+BINARY_PROTOCOL = 2
+MESSAGE_DIFF = 0
+MESSAGE_KEYFRAME = 1
+MESSAGE_CONNECTION_CLOSED = 2
+
 
 class WebSocketConnectionError(Exception):
     def __init__(self, message):
@@ -32,10 +40,16 @@ class WebSocketClient(AsyncWebsocketConsumer):
         self.predicted_ball_y = None
         self.ball_x_direction_sign = 0
         self.current_game_state = {}  # Maintain the current game state
+        self.state_fields = []  # Field names for the ids used in diffs
+        self.seq = 0  # Sequence number of the last applied frame
+        self.awaiting_keyframe = False
+        self.resync_pending = False  # A resync request has to be sent
 
     async def connect(self):
         try:
-            async with websockets.connect(self.uri) as websocket:
+            async with websockets.connect(
+                self.uri, subprotocols=[BINARY_SUBPROTOCOL]
+            ) as websocket:
                 logger.info("connect: WebSocket connection success")
                 self.websocket = websocket
                 await self.listen()
@@ -54,17 +68,23 @@ class WebSocketClient(AsyncWebsocketConsumer):
         try:
             while True:
                 message = await self.websocket.recv()
-                data = json.loads(message)
-                encoded_state = data.get("state", "")
+                if isinstance(message, bytes):
+                    data, frame = self.decode_binary_message(message)
+                else:
+                    data = json.loads(message)
+                    frame = None
+                    encoded_state = data.get("state", "")
+                    if encoded_state:
+                        compressed_state = base64.b64decode(encoded_state)
+                        frame = json.loads(zlib.decompress(compressed_state).decode())
 
                 if data.get("type") == "connection_closed":
                     await self.handle_connection_closed(data)
 
-                if encoded_state:
-                    compressed_state = base64.b64decode(encoded_state)
-                    partial_state = json.loads(
-                        zlib.decompress(compressed_state).decode()
-                    )
+                if frame:
+                    partial_state = self.decode_frame(frame)
+                    if self.resync_pending:
+                        await self.send_resync_request()
                     logger.debug(f"Received partial update: {partial_state}")
                     self.current_game_state.update(
                         partial_state
@@ -83,7 +103,11 @@ class WebSocketClient(AsyncWebsocketConsumer):
                     )
                     self.game_running = False
                 current_time = time.time()
-                if current_time - self.last_update_time >= 1:  # Only once per second
+                # Only once per second, except for ball trajectories: they are
+                # only sent when the ball's path changes and their ball
+                # position is the origin predict_ball_y needs
+                new_trajectory = bool(frame and frame.get("ball"))
+                if new_trajectory or current_time - self.last_update_time >= 1:
                     logger.debug(f"Received message: {self.current_game_state}")
                     if data.get("type") == "game_state_update":
                         await self.handle_game_update(self.current_game_state)
@@ -92,6 +116,54 @@ class WebSocketClient(AsyncWebsocketConsumer):
             logger.warning("Connection closed")
             self.delete_ai_player()
 
+    def decode_binary_message(self, message):
+        """Returns (message data, game frame or None) for a binary message"""
+        version, message_type, seq, body, *ball = msgpack.unpackb(
+            message, strict_map_key=False
+        )
+        if version != BINARY_PROTOCOL:
+            logger.warning(f"Unsupported game protocol version: {version}")
+            return {}, None
+        if message_type == MESSAGE_CONNECTION_CLOSED:
+            return {"type": "connection_closed"}, None
+        data = {"type": "game_state_update"}
+        if message_type == MESSAGE_KEYFRAME:
+            frame = {
+                "seq": seq,
+                "keyframe": True,
+                "fields": body[0],
+                "state": body[1],
+            }
+        else:
+            frame = {"seq": seq, "diff": body}
+        if ball:
+            frame["ball"] = ball[0]  # Trajectory [x, y, vx, vy, time]
+        return data, frame
+
+    def decode_frame(self, frame):
+        """Turns a keyframe or a field-id keyed diff into a field-name dict"""
+        if frame.get("keyframe"):
+            self.awaiting_keyframe = False
+            if frame["seq"] < self.seq:
+                return {}
+            self.seq = frame["seq"]
+            self.state_fields = frame["fields"]
+            return dict(zip(frame["fields"], frame["state"]))
+        if not self.state_fields:
+            logger.debug("Diff received before any keyframe, ignoring it")
+            return {}
+        if frame["seq"] <= self.seq:
+            return {}  # Already covered by a later frame
+        if frame["seq"] != self.seq + 1 and not self.awaiting_keyframe:
+            logger.debug(f"Missed frames {self.seq + 1}..{frame['seq'] - 1}")
+            self.awaiting_keyframe = True
+            self.resync_pending = True
+        self.seq = frame["seq"]
+        return {
+            self.state_fields[int(field_id)]: value
+            for field_id, value in frame["diff"].items()
+        }
+
     async def handle_game_update(self, state):
         ball_x_position = state.get("ball_x_position")
         ball_y_position = state.get("ball_y_position")
@@ -265,6 +337,11 @@ class WebSocketClient(AsyncWebsocketConsumer):
         await self.websocket.send(json.dumps(move_command))
         logger.debug(f"{datetime.datetime.now()} - Sent move command")
 
+    async def send_resync_request(self):
+        self.resync_pending = False
+        await self.websocket.send(json.dumps({"action": "resync"}))
+        logger.debug("Sent resync request")
+
     async def handle_connection_closed(self, data):
         logger.debug("Connection closed by server.")
         self.game_running = False
@@ -5,11 +5,25 @@ from rest_framework import generics, serializers
 from django.core.cache import cache
 from .serializers import AIPlayerSerializer
 import logging
+import urllib.request
 from .consumers import WebSocketClient, WebSocketConnectionError
 
 logger = logging.getLogger("AIOpponent")
 
 
+def game_socket_uri(game_id):
+    """WebSocket URI of the game on the pong-api worker hosting it"""
+    worker = "pong-api:8000"
+    try:
+        with urllib.request.urlopen(
+            f"http://pong-api:8000/game/route/ws/game/{game_id}/", timeout=2
+        ) as response:
+            worker = response.headers.get("X-Game-Worker", worker)
+    except OSError as e:
+        logger.warning(f"Could not resolve worker of game {game_id}: {e}")
+    return f"ws://{worker}/ws/game/{game_id}/"
+
+
 class CreateAIPlayer(generics.CreateAPIView):
     serializer_class = AIPlayerSerializer
 
@@ -27,9 +41,7 @@ class CreateAIPlayer(generics.CreateAPIView):
 
         # Connect to the WebSocket server
         try:
-            ws_client = WebSocketClient(
-                f"ws://pong-api:8000/ws/game/{target_game_id}/", ai_player
-            )
+            ws_client = WebSocketClient(game_socket_uri(target_game_id), ai_player)
             ws_client.start()
             logger.info(
                 f"Successfully connected to WebSocket for game {target_game_id}"
@@ -467,8 +467,9 @@ export default class Game {
       this.gameData.opponentPaddle.setX(serverX);
     }
 
-    const ballX = state.ball_y_position - this.params.dimensions.boundaries.x;
-    const ballZ = state.ball_x_position - this.params.dimensions.boundaries.y;
+    const ball = this.network.ballPosition();
+    const ballX = ball.y - this.params.dimensions.boundaries.x;
+    const ballZ = ball.x - this.params.dimensions.boundaries.y;
     this.pongTable.ball.updateFromGameEngine(ballX, ballZ);
   }
 
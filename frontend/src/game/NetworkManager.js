@@ -1,5 +1,6 @@
 import { createSignal } from '@reactivity';
 import pako from 'pako';
+import StateFrameDecoder from '@/game/utils/StateFrameDecoder.js';
 
 export default class NetworkManager {
   constructor(params) {
@@ -28,6 +29,7 @@ export default class NetworkManager {
     this.gameEngineState = {
       connected: false,
     };
+    this.frameDecoder = new StateFrameDecoder(() => this.resync());
 
     this.createSignals();
 
@@ -237,6 +239,7 @@ export default class NetworkManager {
       const wsUrl = `${this.protocol}//${this.hostname}:${port}/ws/game/${this.userState.match.id}/`;
 
       this.gameEngineSocket = new WebSocket(wsUrl);
+      this.frameDecoder = new StateFrameDecoder(() => this.resync());
       this.setupGameEngineListeners();
 
       return Promise.race([
@@ -284,8 +287,8 @@ export default class NetworkManager {
           bytes[i] = binaryString.charCodeAt(i);
         }
 
-        const partialGameState = JSON.parse(
-          pako.inflate(bytes, { to: 'string' })
+        const partialGameState = this.frameDecoder.decode(
+          JSON.parse(pako.inflate(bytes, { to: 'string' }))
         );
 
         this.gameEngineState.state = {
@@ -312,6 +315,24 @@ export default class NetworkManager {
     }
   }
 
+  /**
+   * Ball position on the server board at `now`. When the server sends
+   * trajectories (GAME_BALL_UPDATES = "trajectory") it is extrapolated from
+   * the last one and kept inside the board until the next bounce arrives,
+   * otherwise it is the last position received.
+   */
+  ballPosition(now = performance.now()) {
+    const state = this.gameEngineState.state;
+    const ball = this.frameDecoder.ballAt(now);
+    if (!ball) return { x: state.ball_x_position, y: state.ball_y_position };
+    const width = state.game_width ?? 60;
+    const height = state.game_height ?? 40;
+    return {
+      x: Math.min(Math.max(ball.x, 0), width),
+      y: Math.min(Math.max(ball.y, 0), height),
+    };
+  }
+
   move(direction) {
     if (!this.gameEngineSocket) return;
     this.sendGameEngineMessage({
@@ -327,4 +348,11 @@ export default class NetworkManager {
       action: 'toggle',
     });
   }
+
+  resync() {
+    if (!this.gameEngineSocket) return;
+    this.sendGameEngineMessage({
+      action: 'resync',
+    });
+  }
 }
@@ -0,0 +1,69 @@
+/**
+ * Decodes game frames sent by pong-api into plain objects keyed by field
+ * name. Keyframes carry every value plus the field names; diffs only carry
+ * the changed values keyed by the index of the field in that list.
+ *
+ * Every frame has a sequence number. Diffs already covered by a later frame
+ * are skipped, and when a diff skips ahead onResync is called once so the
+ * caller can ask the server for a fresh keyframe.
+ *
+ * When pong-api sends ball trajectories (GAME_BALL_UPDATES = "trajectory")
+ * frames only carry the ball when its path changes, as
+ * "ball": [x, y, vx, vy, time]. The latest one is kept in `trajectory` and
+ * ballAt() extrapolates the ball position from it.
+ */
+export default class StateFrameDecoder {
+  constructor(onResync = null) {
+    this.fields = [];
+    this.seq = 0;
+    this.onResync = onResync;
+    this.awaitingKeyframe = false;
+    this.trajectory = null;
+  }
+
+  decode(frame) {
+    if (frame.keyframe) {
+      this.awaitingKeyframe = false;
+      if (frame.seq < this.seq) return {};
+      this.seq = frame.seq;
+      this.fields = frame.fields;
+      this.setTrajectory(frame.ball);
+      const state = {};
+      frame.fields.forEach((name, index) => {
+        state[name] = frame.state[index];
+      });
+      return state;
+    }
+
+    // A diff can only be applied once the field names are known
+    if (this.fields.length === 0 || frame.seq <= this.seq) return {};
+    if (frame.seq !== this.seq + 1 && !this.awaitingKeyframe) {
+      this.awaitingKeyframe = true;
+      this.onResync?.();
+    }
+    this.seq = frame.seq;
+    this.setTrajectory(frame.ball);
+    const partialState = {};
+    for (const [fieldId, value] of Object.entries(frame.diff)) {
+      partialState[this.fields[fieldId]] = value;
+    }
+    return partialState;
+  }
+
+  setTrajectory(ball) {
+    if (!ball) return;
+    const [x, y, vx, vy] = ball;
+    this.trajectory = { x, y, vx, vy, receivedAt: performance.now() };
+  }
+
+  /**
+   * Ball position at `now` (a performance.now() time) on the last received
+   * trajectory, or null when the server sends ball positions instead
+   */
+  ballAt(now) {
+    if (!this.trajectory) return null;
+    const { x, y, vx, vy, receivedAt } = this.trajectory;
+    const elapsed = (now - receivedAt) / 1000;
+    return { x: x + vx * elapsed, y: y + vy * elapsed };
+  }
+}
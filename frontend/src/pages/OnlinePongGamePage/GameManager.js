@@ -1,6 +1,7 @@
 import { createSignal, createEffect } from '@reactivity';
 import pako from 'pako';
 import lerp from '@/game/utils/lerp.js';
+import StateFrameDecoder from '@/game/utils/StateFrameDecoder.js';
 
 const BASE_SCALE = 10;
 const SEND_INTERVAL_MS = 10;
@@ -31,6 +32,7 @@ export default class GameManager {
     this.isRunning = false;
     this.updateCallbacks = [];
     this.currentGameState = {};
+    this.frameDecoder = new StateFrameDecoder(() => this.requestResync());
     this.lastSendTime = 0;
     this.animationId = null;
 
@@ -218,6 +220,7 @@ export default class GameManager {
       this.ws = new WebSocket(
         `${wsProtocol}//${window.location.hostname}:8443/ws/game/${this.gameData.id}/`
       );
+      this.frameDecoder = new StateFrameDecoder(() => this.requestResync());
 
       this.ws.onopen = () => {
         //console.log('Game Engine WebSocket connected.');
@@ -257,7 +260,9 @@ export default class GameManager {
           bytes[i] = binaryString.charCodeAt(i);
         }
 
-        const partialState = JSON.parse(pako.inflate(bytes, { to: 'string' }));
+        const partialState = this.frameDecoder.decode(
+          JSON.parse(pako.inflate(bytes, { to: 'string' }))
+        );
       const previousState = { ...this.currentGameState };
       
       // Update the current game state
@@ -371,6 +376,15 @@ export default class GameManager {
     }
   }
 
+  /**
+   * Ask the server for a keyframe after missing game frames
+   */
+  requestResync() {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(JSON.stringify({ action: 'resync' }));
+    }
+  }
+
   /**
    * Toggle the game state between running and paused
    */
@@ -477,6 +491,23 @@ export default class GameManager {
     };
   }
 
+  /**
+   * Ball position extrapolated from the last trajectory sent by the server,
+   * kept inside the board until the next bounce arrives. Null when the
+   * server sends ball positions.
+   */
+  extrapolateBall() {
+    const ball = this.frameDecoder.ballAt(performance.now());
+    if (!ball) return null;
+    const { scaleFactor } = this.gameDimensionsSig[0]();
+    const height = this.currentGameState.game_height ?? 40;
+    const width = this.currentGameState.game_width ?? 60;
+    return {
+      x: Math.min(Math.max(ball.x, 0), width) * BASE_SCALE * scaleFactor,
+      y: Math.min(Math.max(ball.y, 0), height) * BASE_SCALE * scaleFactor,
+    };
+  }
+
   update(delta) {
     if (!this.isGameRunning) return;
 
@@ -494,7 +525,7 @@ export default class GameManager {
           this.targetPositions.player2Position,
           interpolationFactor
         ),
-        ball: {
+        ball: this.extrapolateBall() ?? {
           x: lerp(
             this.previousPositions.ball.x,
             this.targetPositions.ball.x,
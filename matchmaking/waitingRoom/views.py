@@ -6,6 +6,7 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.core.cache import cache
 from asgiref.sync import async_to_sync
 from .models import Match, Tournament
 from .serializers import GameResultSerializer
@@ -15,6 +16,9 @@ from asgiref.sync import async_to_sync
 
 logger = logging.getLogger(__name__)
 
+# How long a processed result's Idempotency-Key is remembered, in seconds
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
 
 async def delay_half_second():
     await asyncio.sleep(0)  # 500ms delay
@@ -121,6 +125,11 @@ def update_game_result(request, match_id):
     channel_layer = get_channel_layer()
 
     logger.info(f"Received request to update game result for match_id: {match_id}")
+    # pong-api retries a result until it gets an answer, with the same key
+    idempotency_key = request.headers.get("Idempotency-Key")
+    if idempotency_key and cache.get(f"game_result:{idempotency_key}"):
+        logger.info(f"Result of match {match_id} already recorded")
+        return Response({"status": "already recorded"}, status=status.HTTP_200_OK)
     match = get_object_or_404(Match, match_id=match_id)
 
     if match.status == Match.FINISHED:
@@ -152,6 +161,8 @@ def update_game_result(request, match_id):
         end_time=request.data.get("end_time"),
     )
     logger.info(f"Match {match_id} updated with scores and times")
+    if idempotency_key:
+        cache.set(f"game_result:{idempotency_key}", match_id, IDEMPOTENCY_KEY_TTL)
 
     # Send match data to history service
     success = async_to_sync(send_match_to_history)(match)
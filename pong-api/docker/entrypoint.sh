@@ -10,7 +10,8 @@ while ! redis-cli ping; do
 done
 
 # Configure Redis settings
-redis-cli CONFIG SET maxclients 10
+# Every Daphne worker keeps its own cache, channel layer and async pools
+redis-cli CONFIG SET maxclients 1000
 redis-cli CONFIG SET maxmemory 2gb
 redis-cli CONFIG SET maxmemory-policy allkeys-lru
 redis-cli CONFIG SET save ""
@@ -31,6 +32,19 @@ python manage.py makemigrations
 # Apply database migrations
 python manage.py migrate
 
-# Start Daphne with Django settings
+# Start one Daphne worker per port from 8000 on. Games are sharded between
+# them, see game/sharding.py
 export DJANGO_SETTINGS_MODULE=pongApi.settings
+WORKER_COUNT=${PONG_API_WORKER_COUNT:-1}
+PONG_API_WORKERS=""
+for i in $(seq 0 $((WORKER_COUNT - 1))); do
+  PONG_API_WORKERS="${PONG_API_WORKERS:+$PONG_API_WORKERS,}pong-api:$((8000 + i))"
+done
+export PONG_API_WORKERS
+
+for i in $(seq 1 $((WORKER_COUNT - 1))); do
+  PONG_API_WORKER="pong-api:$((8000 + i))" \
+    daphne -b 0.0.0.0 -p $((8000 + i)) pongApi.asgi:application &
+done
+export PONG_API_WORKER="pong-api:8000"
 exec daphne -b 0.0.0.0 -p 8000 pongApi.asgi:application
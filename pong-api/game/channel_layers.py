@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import functools
+import logging
+import time
+from channels.exceptions import ChannelFull
+from channels_redis.core import BoundedQueue, RedisChannelLayer
+
+logger = logging.getLogger(__name__)
+
+
+class HybridChannelLayer(RedisChannelLayer):
+    """
+    Redis channel layer that delivers group messages to members living in this
+    process through in-memory queues. Only members of other processes cost a
+    Redis send. Membership is still written to Redis so other processes keep
+    seeing our members, and the list of remote members of a group is re-read
+    at most once every membership_ttl seconds.
+    """
+
+    def __init__(self, *args, membership_ttl=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.membership_ttl = membership_ttl
+        self.local_groups = collections.defaultdict(set)
+        self.local_queues = collections.defaultdict(
+            functools.partial(BoundedQueue, self.capacity)
+        )
+        self.remote_receives = {}
+        self.remote_members = {}  # group: (checked_at, remote channel names)
+        self.local_deliveries = 0
+        self.remote_deliveries = 0
+        self.membership_refreshes = 0
+
+    def is_local_channel(self, channel):
+        return "!" in channel and self.non_local_name(channel).endswith(
+            self.client_prefix + "!"
+        )
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        if self.is_local_channel(channel):
+            self.local_groups[group].add(channel)
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        members = self.local_groups.get(group)
+        if members is not None:
+            members.discard(channel)
+            if not members:
+                del self.local_groups[group]
+                self.remote_members.pop(group, None)
+
+    async def group_send(self, group, message):
+        assert self.valid_group_name(group), "Group name not valid"
+        remote_channels = await self._remote_members(group)
+        for channel in self.local_groups.get(group, ()):
+            self.local_queues[channel].put_nowait(dict(message))
+            self.local_deliveries += 1
+        if remote_channels:
+            results = await asyncio.gather(
+                *(self.send(channel, message) for channel in remote_channels),
+                return_exceptions=True,
+            )
+            for channel, result in zip(remote_channels, results):
+                if isinstance(result, ChannelFull):
+                    logger.warning(f"Channel {channel} full, dropped group message")
+                elif isinstance(result, Exception):
+                    logger.error(f"Error sending group message to {channel}: {result}")
+                else:
+                    self.remote_deliveries += 1
+
+    async def _remote_members(self, group):
+        now = time.monotonic()
+        cached = self.remote_members.get(group)
+        if cached is None or now - cached[0] >= self.membership_ttl:
+            connection = self.connection(self.consistent_hash(group))
+            names = await connection.zrangebyscore(
+                self._group_key(group), time.time() - self.group_expiry, "+inf"
+            )
+            channels = tuple(
+                channel
+                for channel in (name.decode("utf8") for name in names)
+                if not self.is_local_channel(channel)
+            )
+            cached = self.remote_members[group] = (now, channels)
+            self.membership_refreshes += 1
+        return cached[1]
+
+    async def receive(self, channel):
+        if not self.is_local_channel(channel):
+            return await super().receive(channel)
+
+        # A Redis receive stays pending across calls, so local messages never
+        # cancel it and lose what it already buffered.
+        queue = self.local_queues[channel]
+        remote = self.remote_receives.get(channel)
+        if remote is not None and remote.done():
+            del self.remote_receives[channel]
+            return remote.result()
+        if not queue.empty():
+            return queue.get_nowait()
+        if remote is None:
+            remote = asyncio.ensure_future(super().receive(channel))
+            self.remote_receives[channel] = remote
+        local = asyncio.ensure_future(queue.get())
+        try:
+            await asyncio.wait((local, remote), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            local.cancel()
+            remote.cancel()
+            self.remote_receives.pop(channel, None)
+            self.local_queues.pop(channel, None)
+            raise
+        if local.done():
+            return local.result()
+        local.cancel()
+        del self.remote_receives[channel]
+        return remote.result()
+
+    async def flush(self):
+        for remote in self.remote_receives.values():
+            remote.cancel()
+        self.remote_receives.clear()
+        self.local_queues.clear()
+        self.local_groups.clear()
+        self.remote_members.clear()
+        await super().flush()
+
+    def stats(self):
+        return {
+            "local_groups": len(self.local_groups),
+            "local_deliveries": self.local_deliveries,
+            "remote_deliveries": self.remote_deliveries,
+            "membership_refreshes": self.membership_refreshes,
+        }
@@ -0,0 +1,145 @@
+import asyncio
+import time
+import logging
+from django.conf import settings
+from .repository import GameStateRepository
+from . import sharding
+from .tick_scheduler import TickScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpointer:
+    """
+    Writes the live games of this process back to Redis every
+    GAME_CHECKPOINT_INTERVAL seconds, so a restarted worker can resume them.
+    Only games changed since their last checkpoint are written, all in one
+    pipeline. Ended games are skipped, their state is deleted on teardown.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(Checkpointer, cls).__new__(cls)
+            instance.__init__()
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "initialized"):
+            return
+        self.interval = settings.GAME_CHECKPOINT_INTERVAL
+        self.repository = GameStateRepository()
+        self.task = None
+        self.recovery = None
+        self.checkpoints = 0
+        self.failures = 0
+        self.last_games = 0
+        self.last_size = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.initialized = True
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+            logger.debug("Started checkpointer")
+
+    async def _run(self):
+        try:
+            while TickScheduler().games:
+                await asyncio.sleep(self.interval)
+                await self.checkpoint()
+        except asyncio.CancelledError:
+            pass
+        logger.debug("Checkpointer loop exited")
+
+    async def checkpoint(self, managers=None):
+        """Saves the given (default: all scheduled) games that changed."""
+        if managers is None:
+            managers = [game.manager for game in TickScheduler().games.values()]
+        pending = []
+        for manager in managers:
+            game_state = manager.game_state
+            if game_state.is_game_ended:
+                continue
+            unsaved = game_state.take_unsaved()
+            if unsaved:
+                pending.append((game_state, unsaved))
+        if not pending:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            # States are encoded before the first await, so no tick can
+            # interleave with the snapshot
+            size = await self.repository.save_many(
+                [game_state for game_state, _ in pending]
+            )
+        except Exception as e:
+            self.failures += 1
+            for game_state, unsaved in pending:
+                game_state.mark_unsaved(unsaved)
+            logger.error(f"Checkpoint of {len(pending)} games failed: {e}")
+            return 0
+        self.last_duration = time.perf_counter() - started
+        self.max_duration = max(self.max_duration, self.last_duration)
+        self.last_games = len(pending)
+        self.last_size = size
+        self.checkpoints += 1
+        logger.debug(
+            f"Checkpointed {len(pending)} games, {size} bytes in {self.last_duration * 1000:.2f} ms"
+        )
+        return len(pending)
+
+    async def ensure_recovered(self):
+        """Runs recover() once per process, concurrent callers wait for it."""
+        if self.recovery is None:
+            self.recovery = asyncio.ensure_future(self.recover())
+        try:
+            await self.recovery
+        except Exception as e:
+            logger.error(f"Game recovery failed: {e}", exc_info=True)
+
+    async def recover(self):
+        """
+        Recreates the managers of this worker's checkpointed games after a
+        restart. Games created but never played have no checkpoint and are
+        loaded on their first connection as usual.
+        Running games are paused so nobody scores while the players
+        reconnect; they resume from their last checkpoint with a toggle.
+        """
+        from .game_state_manager import GameStateManager
+
+        recovered = []
+        for game_id in await self.repository.checkpointed_ids():
+            if game_id in GameStateManager._instances:
+                continue
+            if not await sharding.is_owned(game_id):
+                continue  # Recovered by the worker hosting it
+            if await self.repository.is_expiring(game_id):
+                continue  # Abandoned, loaded again if someone reconnects
+            game_state = await self.repository.load(game_id)
+            if game_state is None or game_state.is_game_ended:
+                await self.repository.forget(game_id)  # Expired or deleted
+                continue
+            if game_state.is_game_running:
+                game_state.is_game_running = False
+                await self.repository.save(game_state)
+            GameStateManager(game_id, game_state)
+            recovered.append(game_id)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} games: {recovered}")
+        return recovered
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "checkpoints": self.checkpoints,
+            "failures": self.failures,
+            "last_games": self.last_games,
+            "last_size": self.last_size,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+        }
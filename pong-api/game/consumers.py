@@ -1,14 +1,10 @@
-import json
-import datetime
-import aiohttp
-from django.utils import timezone
-import zlib
-import base64
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.core.cache import cache
 from .game_state_manager import GameStateManager
-from .engine.pong_game_engine import PongGameEngine
+from .presence import GamePresence
+from . import sharding
+from . import protocol
+from . import rate_limit
 
 logger = logging.getLogger(__name__)
 
@@ -17,39 +13,52 @@ class GameConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.game_id = self.scope["url_route"]["kwargs"]["game_id"]
         self.game_group_name = f"game_{self.game_id}"
-        self.game_state_manager = GameStateManager(self.game_id)
+        if not await sharding.is_owned(self.game_id):
+            # Game state lives in another worker's memory, see game/sharding.py
+            logger.warning(
+                f"Rejected socket for game {self.game_id} hosted by another worker"
+            )
+            await self.close()
+            return
+        self.game_state_manager = await GameStateManager.load(self.game_id)
+        self.input_guard = rate_limit.InputGuard()
+        self.protocol, subprotocol = protocol.negotiate(
+            self.scope.get("subprotocols", [])
+        )
 
         await self.channel_layer.group_add(self.game_group_name, self.channel_name)
-        await self.accept()
+        await self.accept(subprotocol)
 
-        connected_clients = cache.get(f"{self.game_id}_connected_clients", 0) + 1
-        cache.set(f"{self.game_id}_connected_clients", connected_clients)
+        connected_clients = await GamePresence().join(self.game_id, self.channel_name)
         logger.debug(
             f"Client connected: {self.channel_name}, Total connected clients: {connected_clients}, For game: {self.game_id}"
         )
-        await self.game_state_manager.send_full_game_state(
+        # Only the joining client gets the current state, the rest of the
+        # group keeps receiving diffs undisturbed
+        await self.send_frame(await self.game_state_manager.build_snapshot())
+
+        # Idempotent, so concurrent joins cannot start the game twice
+        await self.game_state_manager.start_periodic_updates(
             self.channel_layer, self.game_group_name
         )
 
-        if connected_clients == 1:
-            await self.game_state_manager.start_periodic_updates(
-                self.channel_layer, self.game_group_name
-            )
-            logger.debug(f"Started periodic updates for game: {self.game_id}")
-
     async def disconnect(self, close_code):
+        if not hasattr(self, "game_state_manager"):
+            return  # Rejected before joining the game
         try:
             await self.channel_layer.group_discard(
                 self.game_group_name, self.channel_name
             )
 
-            connected_clients = cache.get(f"{self.game_id}_connected_clients", 0) - 1
-            cache.set(f"{self.game_id}_connected_clients", connected_clients)
+            self.game_state_manager.touch()
+            presence = GamePresence()
+            connected_clients = await presence.leave(self.game_id, self.channel_name)
             logger.debug(
                 f"Client disconnected: {self.channel_name}, Total connected clients: {connected_clients}"
             )
 
-            if connected_clients == 0:
+            # The game is ticked by this process, so only local clients count
+            if presence.local_count(self.game_id) == 0:
                 await self.game_state_manager.stop_periodic_updates()
                 logger.debug(f"Stopped periodic updates for game: {self.game_id}")
 
@@ -71,7 +80,7 @@ class GameConsumer(AsyncWebsocketConsumer):
         try:
             # Handle the connection closed event
             logger.debug(f"connection_closed message received for game {self.game_id}")
-            await self.send(text_data=json.dumps({"type": "connection_closed"}))
+            await self.send_message(protocol.encode_connection_closed(self.protocol))
             await self.close_all_connections()
             await self.close()
         except Exception as e:
@@ -84,7 +93,7 @@ class GameConsumer(AsyncWebsocketConsumer):
         try:
             # Notify all clients that the connection has ended
             logger.debug(f"Closing all connections for game {self.game_id}")
-            self.game_state_manager.game_state.delete()
+            await self.game_state_manager.delete_game_state()
             await self.channel_layer.group_send(
                 self.game_group_name,
                 {
@@ -99,23 +108,43 @@ class GameConsumer(AsyncWebsocketConsumer):
                 exc_info=True,
             )
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        action = text_data_json["action"]
-        logger.debug(f"Received action: {action}")
+    async def send_message(self, data):
+        if isinstance(data, bytes):
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Screened before decoding, so a flooding client costs little
+        verdict, close_code = self.input_guard.check(text_data, bytes_data)
+        if verdict == rate_limit.DROP:
+            return
+        if verdict == rate_limit.CLOSE:
+            logger.warning(
+                f"Closing socket {self.channel_name} of game {self.game_id}: input limits exceeded"
+            )
+            await self.close(code=close_code)
+            return
+        try:
+            text_data_json = protocol.decode_client_message(text_data, bytes_data)
+            action = text_data_json["action"]
+            if action == "move":
+                player_id = int(text_data_json["player_id"])
+                direction = int(text_data_json["direction"])
+        except (ValueError, TypeError, KeyError):
+            self.input_guard.malformed()
+            logger.warning(f"Dropped malformed message from {self.channel_name}")
+            return
+        self.game_state_manager.touch()
+        logger.debug("Received action: %s", action)
 
         if action == "move":
-            player_id = text_data_json["player_id"]
-            direction = text_data_json["direction"]
-
-            logger.debug(
-                f"{datetime.datetime.now()} - Move action received: player_id={player_id}, direction={direction}"
-            )
+            # Applied once per tick by the tick loop, see InputQueue
+            self.game_state_manager.queue_move(player_id, direction)
 
-            await self.game_state_manager.move_player(player_id, direction)
-            logger.debug(
-                f"Game state updated and sent for move action: player_id={player_id}, direction={direction}"
-            )
+        if action == "resync":
+            logger.debug(f"Resync requested by client: {self.channel_name}")
+            await self.send_frame(await self.game_state_manager.build_snapshot())
 
         if action == "toggle":
             logger.debug("Toggle action received")
@@ -124,20 +153,17 @@ class GameConsumer(AsyncWebsocketConsumer):
                 f"Game running state toggled to: {self.game_state_manager.game_state.is_game_running}"
             )
 
+    async def send_frame(self, event):
+        # Frames arrive already encoded once for the whole group
+        if self.protocol == protocol.BINARY_PROTOCOL:
+            await self.send(bytes_data=event["bytes"])
+        else:
+            await self.send(text_data=event["text"])
+
     async def game_state_update(self, event):
         try:
-            encoded_data = event["state"]
-            compressed_data = base64.b64decode(encoded_data)
-            game_state_data = json.loads(zlib.decompress(compressed_data).decode())
-            for key, value in game_state_data.items():
-                setattr(self.game_state_manager.game_state, key, value)
-
-            await self.send(
-                text_data=json.dumps(
-                    {"type": "game_state_update", "state": encoded_data}
-                )
-            )
-            logger.debug(f"Game state update sent to client: {self.channel_name}")
+            await self.send_frame(event)
+            logger.debug("Game state update sent to client: %s", self.channel_name)
             try:
                 if self.game_state_manager.game_state.is_game_ended:
                     await self.close_all_connections()
@@ -151,3 +177,77 @@ class GameConsumer(AsyncWebsocketConsumer):
                 f"game_state_update exception: {e}",
                 exc_info=True,
             )
+
+
+class SpectatorConsumer(AsyncWebsocketConsumer):
+    """
+    Read-only game stream. Spectators join their own group, fed with
+    timestamped keyframes at GAME_SPECTATOR_RATE, and never touch the player
+    counters or the players' frame stream.
+    """
+
+    async def connect(self):
+        self.game_id = self.scope["url_route"]["kwargs"]["game_id"]
+        self.spectator_group_name = f"game_{self.game_id}_spectators"
+        if not await sharding.is_owned(self.game_id):
+            await self.close()
+            return
+        self.game_state_manager = await GameStateManager.load(self.game_id)
+        self.input_guard = rate_limit.InputGuard()
+        self.protocol, subprotocol = protocol.negotiate(
+            self.scope.get("subprotocols", [])
+        )
+
+        await self.channel_layer.group_add(self.spectator_group_name, self.channel_name)
+        await self.accept(subprotocol)
+        self.game_state_manager.spectators += 1
+        self.joined = True
+        logger.debug(
+            f"Spectator connected: {self.channel_name}, Total spectators: {self.game_state_manager.spectators}, For game: {self.game_id}"
+        )
+        await self.game_state_update(
+            await self.game_state_manager.build_snapshot(timestamp=True)
+        )
+
+    async def disconnect(self, close_code):
+        try:
+            await self.channel_layer.group_discard(
+                self.spectator_group_name, self.channel_name
+            )
+            if getattr(self, "joined", False):
+                self.joined = False
+                self.game_state_manager.spectators -= 1
+                self.game_state_manager.touch()
+                logger.debug(f"Spectator disconnected: {self.channel_name}")
+        except Exception as e:
+            logger.error(f"Spectator disconnect exception: {e}", exc_info=True)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Spectators have nothing to send, but a flood still costs the worker
+        verdict, close_code = self.input_guard.check(text_data, bytes_data)
+        if verdict == rate_limit.CLOSE:
+            logger.warning(
+                "Closing spectator socket %s of game %s: input limits exceeded",
+                self.channel_name,
+                self.game_id,
+            )
+            await self.close(code=close_code)
+            return
+        logger.debug("Ignoring message from spectator: %s", self.channel_name)
+
+    async def game_state_update(self, event):
+        try:
+            if self.protocol == protocol.BINARY_PROTOCOL:
+                await self.send(bytes_data=event["bytes"])
+            else:
+                await self.send(text_data=event["text"])
+        except Exception as e:
+            logger.error(f"Spectator game_state_update exception: {e}", exc_info=True)
+
+    async def connection_closed(self, event):
+        message = protocol.encode_connection_closed(self.protocol)
+        if isinstance(message, bytes):
+            await self.send(bytes_data=message)
+        else:
+            await self.send(text_data=message)
+        await self.close()
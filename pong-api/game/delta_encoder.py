@@ -0,0 +1,104 @@
+import logging
+import time
+from django.conf import settings
+from .runtime_state import FIELD_IDS, GAME_STATE_FIELDS
+
+logger = logging.getLogger(__name__)
+
+BALL_POSITION_MASK = (1 << FIELD_IDS["ball_x_position"]) | (
+    1 << FIELD_IDS["ball_y_position"]
+)
+# Fields whose change starts a new ball trajectory: bounces change a
+# direction, points and toggles change is_game_running
+TRAJECTORY_MASK = (
+    (1 << FIELD_IDS["ball_x_direction"])
+    | (1 << FIELD_IDS["ball_y_direction"])
+    | (1 << FIELD_IDS["is_game_running"])
+    | (1 << FIELD_IDS["is_game_ended"])
+)
+
+
+class DeltaEncoder:
+    """
+    Turns a RuntimeGameState into game frames. Diffs carry only the fields
+    whose dirty bit is set, keyed by field id; every keyframe_interval ticks
+    a keyframe with all values (and the field names the ids refer to) is
+    emitted instead so clients that missed a diff resynchronise.
+
+    Frame formats:
+        keyframe: {"seq": n, "keyframe": True, "fields": [name, ...], "state": [value, ...]}
+        diff:     {"seq": n, "diff": {field_id: value, ...}}
+
+    With `trajectory` set, the ball position is left out of diffs while the
+    ball moves in a straight line. Keyframes and frames where the trajectory
+    changed carry it as "ball": [x, y, vx, vy, time]: the origin, the
+    velocity in units per second (0 while the game is stopped) and the
+    server time in ms, from which clients extrapolate the ball.
+    """
+
+    def __init__(self, keyframe_interval, trajectory=False):
+        self.keyframe_interval = keyframe_interval
+        self.trajectory = trajectory
+        self.seq = 0
+        self.ticks_since_keyframe = 0
+
+    def encode(self, game_state):
+        """Returns the frame for this tick, or None if nothing changed."""
+        dirty = game_state.take_dirty()
+        self.ticks_since_keyframe += 1
+        if self.ticks_since_keyframe >= self.keyframe_interval:
+            return self.keyframe(game_state)
+        new_trajectory = False
+        if self.trajectory:
+            if dirty & TRAJECTORY_MASK:
+                new_trajectory = True
+                dirty |= BALL_POSITION_MASK
+            else:
+                dirty &= ~BALL_POSITION_MASK
+        if not dirty:
+            return None
+
+        diff = {}
+        while dirty:
+            lowest_bit = dirty & -dirty
+            field_id = lowest_bit.bit_length() - 1
+            diff[field_id] = getattr(game_state, GAME_STATE_FIELDS[field_id])
+            dirty ^= lowest_bit
+        self.seq += 1
+        frame = {"seq": self.seq, "diff": diff}
+        if new_trajectory:
+            frame["ball"] = self.ball_trajectory(game_state)
+        return frame
+
+    def ball_trajectory(self, game_state):
+        """[x, y, vx, vy, time] of the ball's current straight-line path."""
+        moving = game_state.is_game_running and not game_state.is_game_ended
+        # Directions are distances per GAME_TICK_RATE tick
+        rate = settings.GAME_TICK_RATE if moving else 0
+        return [
+            game_state.ball_x_position,
+            game_state.ball_y_position,
+            game_state.ball_x_direction * rate,
+            game_state.ball_y_direction * rate,
+            int(time.time() * 1000),
+        ]
+
+    def snapshot(self, game_state):
+        """
+        Full state at the current seq. Unlike keyframe() it leaves the seq and
+        the keyframe interval of the diff stream untouched.
+        """
+        frame = {
+            "seq": self.seq,
+            "keyframe": True,
+            "fields": GAME_STATE_FIELDS,
+            "state": [getattr(game_state, name) for name in GAME_STATE_FIELDS],
+        }
+        if self.trajectory:
+            frame["ball"] = self.ball_trajectory(game_state)
+        return frame
+
+    def keyframe(self, game_state):
+        self.seq += 1
+        self.ticks_since_keyframe = 0
+        return self.snapshot(game_state)
@@ -0,0 +1,302 @@
+import logging
+import numpy as np
+from .pong_game_engine import CollisionGeometry
+
+logger = logging.getLogger(__name__)
+
+# Per-game values that never change while a game is running
+CONFIG_ARRAYS = (
+    "game_width",
+    "game_height",
+    "paddle_height",
+    "paddle_offset",
+    "paddle_1_x_position",
+    "paddle_2_x_position",
+    "ball_radius",
+    "ball_speed",
+    "max_score",
+    "dt",
+)
+# Per-game values advanced every tick
+STATE_ARRAYS = (
+    "ball_x_position",
+    "ball_y_position",
+    "ball_x_direction",
+    "ball_y_direction",
+    "player_1_position",
+    "player_2_position",
+)
+SCORE_ARRAYS = ("player_1_score", "player_2_score")
+FLAG_ARRAYS = ("is_game_running", "is_game_ended", "same_player_ids")
+# Values a step can change, written back to the game states
+SYNCED_ARRAYS = STATE_ARRAYS + SCORE_ARRAYS + ("is_game_running", "is_game_ended")
+
+
+class BatchPongEngine:
+    """
+    Steps every game of a worker at once. Games live in structure-of-arrays
+    buffers (one slot per game) and each rule of PongGameEngine is applied to
+    the whole batch through boolean masks, in the same order and with the same
+    arithmetic, so results match the scalar engine.
+
+    While a game has a slot the buffers are its source of truth: step_many()
+    writes back to the RuntimeGameState only the values a step changed, and
+    changes made outside the engine are copied in with load().
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.size = 0
+        self.slots = {}
+        self.game_ids = []
+        self.states = []
+        self.arrays = {}
+        for name in CONFIG_ARRAYS + STATE_ARRAYS:
+            self.arrays[name] = np.zeros(capacity, dtype=np.float64)
+        for name in SCORE_ARRAYS:
+            self.arrays[name] = np.zeros(capacity, dtype=np.int64)
+        for name in FLAG_ARRAYS:
+            self.arrays[name] = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, game_id):
+        return game_id in self.slots
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, array in self.arrays.items():
+            grown = np.zeros(self.capacity, dtype=array.dtype)
+            grown[: self.size] = array[: self.size]
+            self.arrays[name] = grown
+        logger.debug(f"BatchPongEngine grown to capacity {self.capacity}")
+
+    def add(self, game_id, game_state):
+        """Allocates a slot for the game and loads its full state into it."""
+        if game_id in self.slots:
+            slot = self.slots[game_id]
+            self.states[slot] = game_state
+            self.load(game_id, game_state)
+            return slot
+        if self.size == self.capacity:
+            self._grow()
+        slot = self.size
+        self.size += 1
+        self.slots[game_id] = slot
+        self.game_ids.append(game_id)
+        self.states.append(game_state)
+
+        a = self.arrays
+        a["game_width"][slot] = game_state.game_width
+        a["game_height"][slot] = game_state.game_height
+        a["paddle_height"][slot] = game_state.paddle_height
+        a["paddle_offset"][slot] = game_state.paddle_offset
+        a["paddle_1_x_position"][slot] = game_state.game_width - (
+            game_state.paddle_width + game_state.paddle_offset
+        )
+        a["paddle_2_x_position"][slot] = (
+            game_state.paddle_width + game_state.paddle_offset
+        )
+        a["ball_radius"][slot] = game_state.ball_radius
+        a["ball_speed"][slot] = game_state.ball_speed
+        a["max_score"][slot] = game_state.max_score
+        a["dt"][slot] = CollisionGeometry(game_state).dt
+        a["same_player_ids"][slot] = game_state.player_1_id == game_state.player_2_id
+        self.load(game_id, game_state)
+        return slot
+
+    def remove(self, game_id):
+        """Frees the game's slot by moving the last game into it."""
+        slot = self.slots.pop(game_id, None)
+        if slot is None:
+            return
+        last = self.size - 1
+        if slot != last:
+            for array in self.arrays.values():
+                array[slot] = array[last]
+            moved_id = self.game_ids[last]
+            self.game_ids[slot] = moved_id
+            self.states[slot] = self.states[last]
+            self.slots[moved_id] = slot
+        self.game_ids.pop()
+        self.states.pop()
+        self.size -= 1
+
+    def load(self, game_id, game_state):
+        """Copies the mutable fields of game_state into the game's slot."""
+        slot = self.slots[game_id]
+        a = self.arrays
+        for name in SYNCED_ARRAYS:
+            a[name][slot] = getattr(game_state, name)
+
+    def store(self, game_id, game_state):
+        """Writes the game's slot back into game_state."""
+        slot = self.slots[game_id]
+        a = self.arrays
+        for name in STATE_ARRAYS:
+            setattr(game_state, name, float(a[name][slot]))
+        for name in SCORE_ARRAYS:
+            setattr(game_state, name, int(a[name][slot]))
+        game_state.is_game_running = bool(a["is_game_running"][slot])
+        game_state.is_game_ended = bool(a["is_game_ended"][slot])
+
+    def step_many(self, substeps):
+        """
+        Runs substeps[slot] physics steps for every slot, then writes the
+        values that changed back to the game states.
+        """
+        n = self.size
+        before = {name: self.arrays[name][:n].copy() for name in SYNCED_ARRAYS}
+        for substep in range(substeps.max(initial=0)):
+            self.step(substeps > substep)
+        states = self.states
+        for name, old in before.items():
+            new = self.arrays[name][:n]
+            changed = np.flatnonzero(new != old)
+            if not changed.size:
+                continue
+            # tolist() converts to Python floats, ints and bools in one call
+            for slot, value in zip(changed.tolist(), new[changed].tolist()):
+                setattr(states[slot], name, value)
+
+    def step(self, mask=None):
+        """
+        Advances every running game by one physics step, or only the games
+        whose slot is set in the boolean `mask`.
+        """
+        n = self.size
+        if n == 0:
+            return
+        a = {name: array[:n] for name, array in self.arrays.items()}
+        active = a["is_game_running"] & ~a["is_game_ended"]
+        if mask is not None:
+            active &= mask[:n]
+        if not active.any():
+            return
+
+        width = a["game_width"]
+        height = a["game_height"]
+        paddle_height = a["paddle_height"]
+        paddle_offset = a["paddle_offset"]
+        paddle_1_x = a["paddle_1_x_position"]
+        paddle_2_x = a["paddle_2_x_position"]
+        radius = a["ball_radius"]
+        speed = a["ball_speed"]
+        same_ids = a["same_player_ids"]
+        dt = a["dt"]
+        bx = a["ball_x_position"]
+        by = a["ball_y_position"]
+        dx = a["ball_x_direction"]
+        dy = a["ball_y_direction"]
+
+        bx[:] = np.where(active, bx + dx * dt, bx)
+        by[:] = np.where(active, by + dy * dt, by)
+
+        # Walls
+        top = active & (by - (radius / 2) <= 0)
+        bottom = active & ~top & (by + radius >= height)
+        wall = top | bottom
+        dy[:] = np.where(wall, dy * -1, dy)
+        by[:] = np.where(wall, by + dy * dt, by)
+
+        # Paddles. The left region belongs to player_2's paddle unless both
+        # ids are equal, in which case the scalar engine resolves player_1.
+        left_region = (
+            active & (paddle_offset <= bx + radius) & (bx + radius <= paddle_2_x)
+        )
+        right_region = (
+            active & ~left_region & (paddle_1_x <= bx) & (bx <= width - paddle_offset)
+        )
+        candidate = left_region | right_region
+        if candidate.any():
+            self._paddle_collisions(
+                a, candidate, right_region | (left_region & same_ids)
+            )
+
+        # Scoring
+        left_goal = active & (bx - radius <= 0)
+        right_goal = active & ~left_goal & (bx + radius >= width)
+        scored = left_goal | right_goal
+        if not scored.any():
+            return
+        player_1_scores = left_goal | (right_goal & same_ids)
+        player_2_scores = right_goal & ~same_ids
+        a["player_1_score"][:] += player_1_scores
+        a["player_2_score"][:] += player_2_scores
+        new_direction = np.where(player_2_scores, -1, 1)
+
+        bx[:] = np.where(scored, width // 2, bx)
+        by[:] = np.where(scored, height // 2, by)
+        dx[:] = np.where(scored, (speed / 4) * new_direction, dx)
+        dy[:] = np.where(scored, (dy / 4) * new_direction, dy)
+        a["is_game_running"][:] &= ~scored
+        new_positions = (height / 2) - paddle_height / 2
+        a["player_1_position"][:] = np.where(
+            scored, new_positions, a["player_1_position"]
+        )
+        a["player_2_position"][:] = np.where(
+            scored, new_positions, a["player_2_position"]
+        )
+        ended = scored & (
+            (a["player_1_score"] >= a["max_score"])
+            | (a["player_2_score"] >= a["max_score"])
+        )
+        a["is_game_ended"][:] |= ended
+
+    def _paddle_collisions(self, a, candidate, is_player_1):
+        radius = a["ball_radius"]
+        speed = a["ball_speed"]
+        paddle_height = a["paddle_height"]
+        dt = a["dt"]
+        bx = a["ball_x_position"]
+        by = a["ball_y_position"]
+        dx = a["ball_x_direction"]
+        dy = a["ball_y_direction"]
+
+        paddle_top = np.where(
+            is_player_1, a["player_1_position"], a["player_2_position"]
+        )
+        paddle_bottom = paddle_top + paddle_height
+        paddle_middle = (paddle_top + paddle_bottom) / 2
+        ball_y_top = by - radius
+        ball_y_bottom = by + radius
+        hit = candidate & ~((ball_y_bottom < paddle_top) | (ball_y_top > paddle_bottom))
+        if not hit.any():
+            return
+
+        top_inside = (paddle_top < ball_y_top) & (ball_y_top < paddle_bottom)
+        bottom_inside = (paddle_top < ball_y_bottom) & (ball_y_bottom < paddle_bottom)
+        contact_point = np.where(top_inside, ball_y_top, by)
+        contact_point = np.where(
+            bottom_inside,
+            np.where(contact_point == ball_y_top, by, ball_y_bottom),
+            contact_point,
+        )
+
+        # Ball "inside" the paddle, mirrors handle_ball_paddle_collision
+        paddle_x = np.where(
+            is_player_1, a["paddle_2_x_position"], a["paddle_1_x_position"]
+        )
+        inside_1 = hit & is_player_1 & (bx + radius < paddle_x)
+        inside_2 = hit & ~is_player_1 & (bx + radius > paddle_x)
+        bx[:] = np.where(inside_1, paddle_x - radius - dx * dt, bx)
+        bx[:] = np.where(inside_2, paddle_x + radius + dx * dt, bx)
+
+        hit_distance_to_center = contact_point - paddle_middle
+        max_y_speed = speed * 0.6
+        normalized_hit_distance = (
+            hit_distance_to_center / (paddle_height / 2)
+        ) * max_y_speed
+        normalized_hit_distance = np.minimum(max_y_speed, normalized_hit_distance)
+
+        new_x_direction = speed - np.abs(normalized_hit_distance)
+        flipped = dx * -1
+        dy[:] = np.where(hit, normalized_hit_distance, dy)
+        dx[:] = np.where(
+            hit,
+            np.where(flipped > 0, new_x_direction, new_x_direction * -1),
+            dx,
+        )
+        by[:] = np.where(hit, by + dy * dt, by)
+        bx[:] = np.where(hit, bx + dx * dt, bx)
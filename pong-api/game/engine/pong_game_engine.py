@@ -1,14 +1,47 @@
 import logging
 import math
-from ..models import GameState
+from django.conf import settings
+from ..runtime_state import RuntimeGameState
+from .tracing import get_tracer
 
 logger = logging.getLogger(__name__)
 
-
-class PongGameEngine:
-    def __init__(self, game_state: GameState):
-        # Only localize variables whos values wont change
-        self.game_state = game_state
+# Most bounces resolved within one swept step, a ball caught in a corner
+# stops at its last impact instead of looping
+MAX_SWEPT_BOUNCES = 4
+
+
+class CollisionGeometry:
+    """
+    Values derived from a game's immutable configuration, computed once per
+    game instead of on every tick.
+    """
+
+    __slots__ = (
+        "game_height",
+        "game_width",
+        "paddle_height",
+        "paddle_width",
+        "paddle_offset",
+        "paddle_1_x_position",
+        "paddle_2_x_position",
+        "right_paddle_limit",
+        "max_paddle_position",
+        "half_paddle_height",
+        "ball_radius",
+        "half_ball_radius",
+        "ball_speed",
+        "max_y_speed",
+        "reset_ball_x_position",
+        "reset_ball_y_position",
+        "reset_ball_x_direction",
+        "reset_paddle_position",
+        "move_step",
+        "dt",
+        "swept",
+    )
+
+    def __init__(self, game_state: RuntimeGameState):
         self.game_height = game_state.game_height
         self.game_width = game_state.game_width
         self.paddle_height = game_state.paddle_height
@@ -18,69 +51,111 @@ class PongGameEngine:
             self.paddle_width + self.paddle_offset
         )
         self.paddle_2_x_position = self.paddle_width + self.paddle_offset
+        self.right_paddle_limit = self.game_width - self.paddle_offset
+        self.max_paddle_position = self.game_height - self.paddle_height
+        self.half_paddle_height = self.paddle_height / 2
         self.ball_radius = game_state.ball_radius
+        self.half_ball_radius = self.ball_radius / 2
         self.ball_speed = game_state.ball_speed
-        self.player_move_step = game_state.move_step
-        logger.debug(
-            "PongGameEngine initialized with game state: %s, game_height: %d, game_width: %d, paddle_height: %d, paddle_width: %d, paddle_offset: %d, ball_radius: %d, ball_speed: %f, player_move_step: %d",
-            game_state,
-            self.game_height,
-            self.game_width,
-            self.paddle_height,
-            self.paddle_width,
-            self.paddle_offset,
-            self.ball_radius,
-            self.ball_speed,
-            self.player_move_step,
-        )
+        # Max percentage of ball_speed that can be "used" in the Y direction
+        self.max_y_speed = self.ball_speed * 0.6
+        self.reset_ball_x_position = self.game_width // 2
+        self.reset_ball_y_position = self.game_height // 2
+        self.reset_ball_x_direction = self.ball_speed / 4
+        self.reset_paddle_position = (self.game_height / 2) - self.paddle_height / 2
+        self.move_step = game_state.move_step
+        # Ball velocities are distances per GAME_TICK_RATE tick, one physics
+        # step at the game's sim_rate covers dt of a tick
+        sim_rate = game_state.sim_rate or settings.GAME_SIM_RATE
+        self.dt = settings.GAME_TICK_RATE / sim_rate
+        self.swept = settings.GAME_COLLISION_MODE == "swept"
 
-    def update_game_state(self):
+
+class PongGameEngine:
+    """
+    Physics for one game. An engine is created once per game and bound to its
+    state; step() advances the bound state by one tick.
+
+    Engine events go through `self.trace`, a GameTracer when the game is
+    traced (see engine/tracing.py) and None otherwise, so an untraced tick
+    pays one truth test per event instead of a logging call.
+    """
+
+    def __init__(self, game_state: RuntimeGameState):
+        self.game_state = game_state
+        self.geometry = CollisionGeometry(game_state)
+        # Kept as attributes for callers that read them directly
+        self.game_height = self.geometry.game_height
+        self.game_width = self.geometry.game_width
+        self.paddle_height = self.geometry.paddle_height
+        self.paddle_width = self.geometry.paddle_width
+        self.paddle_offset = self.geometry.paddle_offset
+        self.paddle_1_x_position = self.geometry.paddle_1_x_position
+        self.paddle_2_x_position = self.geometry.paddle_2_x_position
+        self.ball_radius = self.geometry.ball_radius
+        self.ball_speed = self.geometry.ball_speed
+        self.player_move_step = self.geometry.move_step
+        self.trace = get_tracer(game_state.id)
+        if self.trace:
+            self.trace(
+                "engine_created",
+                game_height=self.game_height,
+                game_width=self.game_width,
+                paddle_height=self.paddle_height,
+                paddle_width=self.paddle_width,
+                paddle_offset=self.paddle_offset,
+                ball_radius=self.ball_radius,
+                ball_speed=self.ball_speed,
+                move_step=self.player_move_step,
+            )
+
+    def step(self):
         """
-        Updates the game state, including ball position, collision detection,
-        and scoring. Saves the updated game state.
+        Advances the bound game by one tick: moves the ball, then resolves
+        wall collisions, paddle collisions and scoring.
         """
-        logger.debug("GameEngine: Updating game state")
-        if not self.game_state.is_game_running or self.game_state.is_game_ended:
-            logger.debug("Game is not running or has ended")
-            return self.game_state
+        game_state = self.game_state
+        if not game_state.is_game_running or game_state.is_game_ended:
+            return
 
-        # Update the positions of the ball
-        self.game_state.ball_x_position += self.game_state.ball_x_direction
-        self.game_state.ball_y_position += self.game_state.ball_y_direction
-        logger.debug(
-            "Ball position updated: x=%s, y=%s",
-            self.game_state.ball_x_position,
-            self.game_state.ball_y_position,
-        )
+        # Looked up per tick so tracing can be switched on mid-match
+        trace = self.trace = get_tracer(game_state.id)
+        if self.geometry.swept:
+            self._sweep()
+            if trace:
+                trace(
+                    "ball_moved",
+                    x=game_state.ball_x_position,
+                    y=game_state.ball_y_position,
+                )
+            self._check_scoring()
+            return
+
+        dt = self.geometry.dt
+        game_state.ball_x_position += game_state.ball_x_direction * dt
+        game_state.ball_y_position += game_state.ball_y_direction * dt
+        if trace:
+            trace(
+                "ball_moved",
+                x=game_state.ball_x_position,
+                y=game_state.ball_y_position,
+            )
 
-        # Check for collisions with the top and bottom walls
         self._check_wall_collisions()
         self._check_paddle_collision()
         self._check_scoring()
 
-        logger.debug("GameEngine: Game state saved")
-        logger.debug(
-            "PongGameEngine saved with game state: game_height: %d, game_width: %d, paddle_height: %d, paddle_width: %d, paddle_offset: %d, ball_radius: %d, player_move_step: %d, ball_y_direction: %f, ball_x_direction: %f",
-            self.game_height,
-            self.game_width,
-            self.paddle_height,
-            self.paddle_width,
-            self.paddle_offset,
-            self.ball_radius,
-            self.player_move_step,
-            self.game_state.ball_y_direction,
-            self.game_state.ball_x_direction,
-        )
+    def update_game_state(self):
+        """
+        Updates the game state, including ball position, collision detection,
+        and scoring. Returns the updated game state.
+        """
+        self.step()
         return self.game_state
 
     def move_player(self, player_id, direction):
-        logger.debug(
-            "Game Engine: Moving player: player_id=%s, direction=%s",
-            player_id,
-            direction,
-        )
+        trace = self.trace = get_tracer(self.game_state.id)
         if not self.game_state.is_game_running or self.game_state.is_game_ended:
-            logger.debug("Game is not running or has ended")
             return self.game_state
 
         if player_id == self.game_state.player_1_id:
@@ -92,50 +167,125 @@ class PongGameEngine:
             return self.game_state
 
         if direction == 1:
-            player_position += self.player_move_step
+            player_position += self.geometry.move_step
         elif direction == -1:
-            player_position -= self.player_move_step
-
-        logger.debug(f"direction: {direction}")
+            player_position -= self.geometry.move_step
 
         # Ensure the player doesn't move out of bounds
         player_position = max(
-            0, min(self.game_height - self.paddle_height, player_position)
+            0, min(self.geometry.max_paddle_position, player_position)
         )
-        logger.debug(f"player position: {player_position}")
 
         if player_id == self.game_state.player_1_id:
             self.game_state.player_1_position = player_position
         elif player_id == self.game_state.player_2_id:
             self.game_state.player_2_position = player_position
 
-        logger.debug(
-            "Player position updated and saved: player_id=%s, position=%s",
-            player_id,
-            player_position,
-        )
+        if trace:
+            trace(
+                "player_moved",
+                player_id=player_id,
+                direction=direction,
+                position=player_position,
+            )
         return self.game_state
 
+    def _sweep(self):
+        """
+        Moves the ball along its whole path of the step. The path is tested
+        as a segment against the walls and the paddle faces, and the ball is
+        reflected at the exact time of impact, so a fast ball or a low
+        sim_rate cannot carry it through a paddle.
+        """
+        game_state = self.game_state
+        geometry = self.geometry
+        radius = geometry.ball_radius
+        # Ball centre positions touching each obstacle, the same planes the
+        # discrete checks test against
+        top_wall = geometry.half_ball_radius
+        bottom_wall = geometry.game_height - radius
+        left_face = geometry.paddle_2_x_position - radius
+        right_face = geometry.paddle_1_x_position
+
+        remaining = 1.0
+        for _ in range(MAX_SWEPT_BOUNCES):
+            x = game_state.ball_x_position
+            y = game_state.ball_y_position
+            vx = game_state.ball_x_direction * geometry.dt
+            vy = game_state.ball_y_direction * geometry.dt
+            impact, obstacle = remaining, None
+
+            if vy < 0:
+                time = max(0.0, (top_wall - y) / vy)
+                if time <= impact:
+                    impact, obstacle = time, "top"
+            elif vy > 0:
+                time = max(0.0, (bottom_wall - y) / vy)
+                if time <= impact:
+                    impact, obstacle = time, "bottom"
+
+            # Only a ball in front of a paddle can hit its face
+            player_id, time = None, None
+            if vx < 0 and x >= left_face:
+                player_id, time = game_state.player_2_id, (left_face - x) / vx
+            elif vx > 0 and x <= right_face:
+                player_id, time = game_state.player_1_id, (right_face - x) / vx
+            if time is not None and time < impact:
+                paddle_top = self._paddle_top(player_id)
+                impact_y = y + vy * time
+                if (
+                    paddle_top is not None
+                    and impact_y + radius >= paddle_top
+                    and impact_y - radius <= paddle_top + self.paddle_height
+                ):
+                    impact, obstacle = time, player_id
+
+            game_state.ball_x_position = x + vx * impact
+            game_state.ball_y_position = y + vy * impact
+            remaining -= impact
+            if obstacle is None:
+                return
+            if obstacle == "top" or obstacle == "bottom":
+                game_state.ball_y_direction *= -1
+                if self.trace:
+                    self.trace(
+                        "wall_bounce", wall=obstacle, dy=game_state.ball_y_direction
+                    )
+                continue
+            self._deflect(self._paddle_top(obstacle))
+            if self.trace:
+                self.trace(
+                    "paddle_hit",
+                    player_id=obstacle,
+                    x=game_state.ball_x_position,
+                    y=game_state.ball_y_position,
+                    dx=game_state.ball_x_direction,
+                    dy=game_state.ball_y_direction,
+                )
+
     def _check_wall_collisions(self):
         """
         Checks for collisions between the ball and the top or bottom walls.
         Reverses the ball's direction if a collision is detected.
         """
-        if self.game_state.ball_y_position - (self.ball_radius / 2) <= 0:
+        if self.game_state.ball_y_position - self.geometry.half_ball_radius <= 0:
             self.game_state.ball_y_direction *= -1
-            self.game_state.ball_y_position += self.game_state.ball_y_direction
-            logger.debug(
-                "Ball collided with top wall and bounced back. New direction: %f",
-                self.game_state.ball_y_direction,
+            self.game_state.ball_y_position += (
+                self.game_state.ball_y_direction * self.geometry.dt
             )
+            if self.trace:
+                self.trace(
+                    "wall_bounce", wall="top", dy=self.game_state.ball_y_direction
+                )
         elif self.game_state.ball_y_position + self.ball_radius >= self.game_height:
             self.game_state.ball_y_direction *= -1
-            self.game_state.ball_y_position += self.game_state.ball_y_direction
-            logger.debug(
-                "Ball collided with bottom wall and bounced back. New direction y: %f; x: %d",
-                self.game_state.ball_y_direction,
-                self.game_state.ball_x_direction,
+            self.game_state.ball_y_position += (
+                self.game_state.ball_y_direction * self.geometry.dt
             )
+            if self.trace:
+                self.trace(
+                    "wall_bounce", wall="bottom", dy=self.game_state.ball_y_direction
+                )
 
     def _check_paddle_collision(self):
         """
@@ -154,7 +304,7 @@ class PongGameEngine:
         elif (
             self.paddle_1_x_position
             <= self.game_state.ball_x_position
-            <= self.game_state.game_width - self.paddle_offset
+            <= self.geometry.right_paddle_limit
         ):
             # ball might hit paddle player_1
             player_id_to_check = self.game_state.player_1_id
@@ -162,20 +312,14 @@ class PongGameEngine:
             # No possibility of hit
             return
 
-        logger.debug(
-            "Ball possibly collided with paddles. Position y: %d ; x: %d",
-            self.game_state.ball_y_position,
-            self.game_state.ball_x_position,
-        )
-
-        if self._handle_paddle_collision(player_id_to_check):
-            logger.debug(
-                "New ball position after colliding with player_%d y: %d ; x: %d, direction: y: %f, x: %f",
-                player_id_to_check,
-                self.game_state.ball_y_position,
-                self.game_state.ball_x_position,
-                self.game_state.ball_y_direction,
-                self.game_state.ball_x_direction,
+        if self._handle_paddle_collision(player_id_to_check) and self.trace:
+            self.trace(
+                "paddle_hit",
+                player_id=player_id_to_check,
+                x=self.game_state.ball_x_position,
+                y=self.game_state.ball_y_position,
+                dx=self.game_state.ball_x_direction,
+                dy=self.game_state.ball_y_direction,
             )
 
     def _handle_paddle_collision(self, player_id):
@@ -186,47 +330,20 @@ class PongGameEngine:
         Args:
             player_id (int): The ID of the player whose paddle collided with the ball.
         """
-        logger.debug(
-            "Handling paddle collision for player_id=%s, \
-            player_1_id=%s, player_2_id=%s, player_1_position=%s, \
-            player_2_position=%s",
-            player_id,
-            self.game_state.player_1_id,
-            self.game_state.player_2_id,
-            self.game_state.player_1_position,
-            self.game_state.player_2_position,
-        )
-
-        # Match ID and find corresponding paddle. If ball behind paddle
-        # set ball_x_position to paddle_x position
-        if player_id == self.game_state.player_1_id:
-            paddle_top = self.game_state.player_1_position
-        elif player_id == self.game_state.player_2_id:
-            paddle_top = self.game_state.player_2_position
-        else:
-            logger.warning("Invalid player_id for paddle collision: %s", player_id)
+        paddle_top = self._paddle_top(player_id)
+        if paddle_top is None:
             return False
 
         paddle_bottom = paddle_top + self.paddle_height
-        paddle_middle = (paddle_top + paddle_bottom) / 2
         ball_y_center = self.game_state.ball_y_position
         ball_y_top = ball_y_center - self.ball_radius
         ball_y_bottom = ball_y_center + self.ball_radius
 
         if ball_y_bottom < paddle_top or ball_y_top > paddle_bottom:
-            logger.debug(f"Ball Y position {ball_y_center} outside of paddle")
+            if self.trace:
+                self.trace("paddle_miss", player_id=player_id, y=ball_y_center)
             return False
 
-         # Determine the contact point on the ball
-        contact_point = ball_y_center
-        if paddle_top < ball_y_top < paddle_bottom:
-            contact_point = ball_y_top
-        if paddle_top < ball_y_bottom < paddle_bottom:
-            if contact_point == ball_y_top:
-                contact_point = ball_y_center
-            else:
-                contact_point = ball_y_bottom
-
         # For cases where ball is "inside" paddle
         self.handle_ball_paddle_collision(
             player_id,
@@ -235,24 +352,59 @@ class PongGameEngine:
             else self.paddle_1_x_position,
             self.game_state.ball_x_position,
             self.ball_radius,
-            self.game_state.ball_x_direction,
+            self.game_state.ball_x_direction * self.geometry.dt,
         )
 
+        self._deflect(paddle_top)
+
+        # Inmediatly move ball to avoid some issues
+        dt = self.geometry.dt
+        self.game_state.ball_y_position += self.game_state.ball_y_direction * dt
+        self.game_state.ball_x_position += self.game_state.ball_x_direction * dt
+
+        return True
+
+    def _paddle_top(self, player_id):
+        """Returns the top of the player's paddle, None for an unknown player."""
+        if player_id == self.game_state.player_1_id:
+            return self.game_state.player_1_position
+        if player_id == self.game_state.player_2_id:
+            return self.game_state.player_2_position
+        logger.warning("Invalid player_id for paddle collision: %s", player_id)
+        return None
+
+    def _deflect(self, paddle_top):
+        """
+        Sends the ball back from the paddle, with a vertical speed set by
+        where it met the paddle.
+        """
+        paddle_bottom = paddle_top + self.paddle_height
+        paddle_middle = (paddle_top + paddle_bottom) / 2
+        ball_y_center = self.game_state.ball_y_position
+        ball_y_top = ball_y_center - self.ball_radius
+        ball_y_bottom = ball_y_center + self.ball_radius
+
+        # Determine the contact point on the ball
+        contact_point = ball_y_center
+        if paddle_top < ball_y_top < paddle_bottom:
+            contact_point = ball_y_top
+        if paddle_top < ball_y_bottom < paddle_bottom:
+            if contact_point == ball_y_top:
+                contact_point = ball_y_center
+            else:
+                contact_point = ball_y_bottom
+
         hit_distance_to_center = contact_point - paddle_middle
-        max_y_speed = (
-            self.ball_speed * 0.6
-        )  # Max percentage of ball_speed that can be "used" in the Y direction
+        max_y_speed = self.geometry.max_y_speed
         normalized_hit_distance = (
-            hit_distance_to_center / (self.paddle_height / 2)
+            hit_distance_to_center / self.geometry.half_paddle_height
         ) * max_y_speed
         normalized_hit_distance = min(max_y_speed, normalized_hit_distance)
 
         if hit_distance_to_center > (paddle_bottom - paddle_middle):
-            logger.debug(
-                "ERROR: hit distance is larger than distance from \
-            paddle center to paddle bottom. Setting hit_distance_to_center \
-            to paddle_bottom - paddle_middle. Needs review"
-            )
+            # Needs review: the contact point lies below the paddle
+            if self.trace:
+                self.trace("hit_distance_clamped", distance=hit_distance_to_center)
             hit_distance_to_center = paddle_bottom - paddle_middle
 
         # ball_x_direction will be what remains of ball_speed after subtracting
@@ -265,11 +417,6 @@ class PongGameEngine:
             if self.game_state.ball_x_direction > 0
             else new_x_direction * -1
         )
-        # Inmediatly move ball to avoid some issues
-        self.game_state.ball_y_position += self.game_state.ball_y_direction
-        self.game_state.ball_x_position += self.game_state.ball_x_direction
-
-        return True
 
     def handle_ball_paddle_collision(
         self,
@@ -284,19 +431,15 @@ class PongGameEngine:
                 self.game_state.ball_x_position = (
                     paddle_x_position - ball_radius - ball_x_direction
                 )
-                logger.debug(
-                    "Ball 'inside' paddle_1, position set to: %f",
-                    self.game_state.ball_x_position,
-                )
+                if self.trace:
+                    self.trace("ball_inside_paddle", player_id=player_id)
         elif player_id == self.game_state.player_2_id:
             if ball_x_position + ball_radius > paddle_x_position:
                 self.game_state.ball_x_position = (
                     paddle_x_position + ball_radius + ball_x_direction
                 )
-                logger.debug(
-                    "Ball 'inside' paddle_2, position set to: %f",
-                    self.game_state.ball_x_position,
-                )
+                if self.trace:
+                    self.trace("ball_inside_paddle", player_id=player_id)
 
     def _check_scoring(self):
         """
@@ -305,10 +448,8 @@ class PongGameEngine:
         """
         if self.game_state.ball_x_position - self.ball_radius <= 0:
             self._handle_score_point(self.game_state.player_1_id)
-            logger.debug("Player 2 scored a point")
         elif self.game_state.ball_x_position + self.ball_radius >= self.game_width:
             self._handle_score_point(self.game_state.player_2_id)
-            logger.debug("Player 2 scored a point")
 
     def _handle_score_point(self, player_id):
         """
@@ -319,7 +460,6 @@ class PongGameEngine:
         Args:
             player_id (int): The ID of the player who scored.
         """
-        logger.debug(f"_handle_score_point() for player id: {player_id}")
         new_ball_direction = 1
         if player_id == self.game_state.player_1_id:
             self.game_state.player_1_score += 1
@@ -327,24 +467,23 @@ class PongGameEngine:
             self.game_state.player_2_score += 1
             new_ball_direction = -1
 
-        logger.debug(
-            "Player scored: player_id=%s, player_1_score=%s, player_2_score=%s",
-            player_id,
-            self.game_state.player_1_score,
-            self.game_state.player_2_score,
-        )
+        if self.trace:
+            self.trace(
+                "point_scored",
+                player_id=player_id,
+                player_1_score=self.game_state.player_1_score,
+                player_2_score=self.game_state.player_2_score,
+            )
 
         # Reset the game positions
-        self.game_state.ball_x_position = self.game_width // 2
-        self.game_state.ball_y_position = self.game_height // 2
-        self.game_state.ball_x_direction = self.game_state.ball_speed / 4
+        self.game_state.ball_x_position = self.geometry.reset_ball_x_position
+        self.game_state.ball_y_position = self.geometry.reset_ball_y_position
+        self.game_state.ball_x_direction = self.geometry.reset_ball_x_direction
         self.game_state.ball_y_direction = self.game_state.ball_y_direction / 4
         self.game_state.ball_x_direction *= new_ball_direction
         self.game_state.ball_y_direction *= new_ball_direction
         self.game_state.is_game_running = False
-        new_players_position = (
-            self.game_state.game_height / 2
-        ) - self.game_state.paddle_height / 2
+        new_players_position = self.geometry.reset_paddle_position
         self.game_state.player_1_position = new_players_position
         self.game_state.player_2_position = new_players_position
 
@@ -352,8 +491,10 @@ class PongGameEngine:
         if self.game_state.player_1_score >= self.game_state.max_score:
             self.game_state.is_game_ended = True
             self.game_state.is_game_running = False
-            logger.debug("Game ended: player 1 won")
+            if self.trace:
+                self.trace("game_ended", winner=self.game_state.player_1_id)
         elif self.game_state.player_2_score >= self.game_state.max_score:
             self.game_state.is_game_ended = True
             self.game_state.is_game_running = False
-            logger.debug("Game ended: player 2 won")
+            if self.trace:
+                self.trace("game_ended", winner=self.game_state.player_2_id)
@@ -0,0 +1,55 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Games traced at runtime, see enable()
+_traced_games = set()
+
+
+class GameTracer:
+    """
+    Emits the engine events of one game as structured log records: the
+    message is formatted lazily and the event name and fields are attached as
+    `game_id`, `trace_event` and `trace_fields` record attributes.
+    """
+
+    __slots__ = ("game_id", "level")
+
+    def __init__(self, game_id, level):
+        self.game_id = game_id
+        self.level = level
+
+    def __call__(self, event, **fields):
+        logger.log(
+            self.level,
+            "game %s: %s %s",
+            self.game_id,
+            event,
+            fields,
+            extra={
+                "game_id": self.game_id,
+                "trace_event": event,
+                "trace_fields": fields,
+            },
+        )
+
+
+def get_tracer(game_id):
+    """
+    Returns the tracer of the game, or None when it is not traced. Games
+    enabled at runtime are traced at INFO, so a single match can be traced in
+    production; setting this logger to DEBUG traces every game.
+    """
+    if game_id in _traced_games:
+        return GameTracer(game_id, logging.INFO)
+    if logger.isEnabledFor(logging.DEBUG):
+        return GameTracer(game_id, logging.DEBUG)
+    return None
+
+
+def enable(game_id):
+    _traced_games.add(game_id)
+
+
+def disable(game_id):
+    _traced_games.discard(game_id)
@@ -1,14 +1,20 @@
 import asyncio
-import copy
-import json
-import aiohttp
+import time
 from django.utils import timezone
-import base64
-import zlib
 import logging
-from django.core.cache import cache
+from django.conf import settings
 from .models import GameState
+from .runtime_state import RuntimeGameState
+from .repository import GameStateRepository
+from .checkpointer import Checkpointer
+from .lifecycle import GameReaper
+from .result_outbox import ResultOutbox
+from . import sharding
+from .delta_encoder import DeltaEncoder
+from .input_queue import InputQueue
+from .protocol import build_frame_event
 from .engine.pong_game_engine import PongGameEngine
+from .tick_scheduler import TickScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -16,141 +22,174 @@ logger = logging.getLogger(__name__)
 class GameStateManager:
     _instances = {}
 
-    def __new__(cls, game_id):
+    def __new__(cls, game_id, game_state=None):
         if game_id not in cls._instances:
             instance = super(GameStateManager, cls).__new__(cls)
-            instance.__init__(game_id)
+            instance.__init__(game_id, game_state)
             cls._instances[game_id] = instance
             logger.debug(
                 f"Created new GameStateManager instance for game_id: {game_id}"
             )
         return cls._instances[game_id]
 
-    def __init__(self, game_id):
+    def __init__(self, game_id, game_state=None):
         if hasattr(self, "initialized"):
             return
         self.game_id = game_id
-        self.game_state = self.get_game_state()
-        self.previous_game_state = copy.deepcopy(self.game_state)
+        self.repository = GameStateRepository()
+        self.game_state = game_state or self.get_game_state()
+        self.encoder = DeltaEncoder(
+            settings.GAME_KEYFRAME_INTERVAL,
+            trajectory=settings.GAME_BALL_UPDATES == "trajectory",
+        )
+        self.engine = PongGameEngine(self.game_state)
         self.lock = asyncio.Lock()
-        self.periodic_task = None
+        self.inputs = InputQueue(settings.GAME_INPUT_MAX_STEPS_PER_TICK)
+        self.spectators = 0
+        self.last_activity = time.monotonic()
         self.initialized = True
         self.match_result_sent = False
+        self.result_task = None
         self.game_start_time = timezone.now()  # Store start time
         logger.debug(f"Initialized GameStateManager for game_id: {game_id}")
 
+    @classmethod
+    async def load(cls, game_id):
+        """Returns the game's manager, reading its state without blocking."""
+        # After a restart the games of the crashed process come back paused
+        await Checkpointer().ensure_recovered()
+        GameReaper().start()
+        ResultOutbox().start()  # Also sends results queued before a restart
+        manager = cls._instances.get(game_id)
+        if manager is None:
+            repository = GameStateRepository()
+            game_state = await repository.load(game_id)
+            if not game_state:
+                raise GameState.DoesNotExist("Game not found in Redis.")
+            # Evicted or abandoned games were left to expire
+            await repository.persist(game_id)
+            await sharding.persist(game_id)
+            # Another connection may have created it while the state loaded
+            manager = cls(game_id, game_state)
+        manager.touch()
+        return manager
+
+    def touch(self):
+        """Records client activity, idle games are evicted by GameReaper."""
+        self.last_activity = time.monotonic()
+
     def get_game_state(self):
-        game_state = GameState.from_cache(self.game_id)
+        game_state = RuntimeGameState.from_cache(self.game_id)
         if not game_state:
             raise GameState.DoesNotExist("Game not found in Redis.")
         logger.debug(f"Retrieved game state for game_id: {self.game_id}")
         return game_state
 
     async def save_game_state(self):
-        self.game_state.save()
+        await self.repository.save(self.game_state)
         logger.debug(f"Saved game state for game_id: {self.game_id}")
 
+    async def delete_game_state(self):
+        await self.repository.delete(self.game_id)
+        await sharding.release(self.game_id)
+        logger.debug(f"Deleted game state for game_id: {self.game_id}")
+
     async def toggle_game(self):
         async with self.lock:
             self.game_state.is_game_running = not self.game_state.is_game_running
             logger.debug(f"Toggled game_id: {self.game_id}")
-
-    async def move_player(self, player_id, direction):
-        async with self.lock:
-            if self.game_state.is_game_running:
-                engine = PongGameEngine(self.game_state)
-
-                self.game_state = engine.move_player(player_id, direction)
-                logger.debug(f"Moved player {player_id} for game_id: {self.game_id}")
-
-    async def update_game_state(self, channel_layer, game_group_name):
+        TickScheduler().wake(self.game_id)
+
+    def queue_move(self, player_id, direction):
+        """Queues a paddle move, applied by the tick loop at the next tick."""
+        self.inputs.push(player_id, direction)
+        TickScheduler().wake(self.game_id)
+
+    def is_idle(self):
+        """
+        Whether the game can be parked: stopped, or ended with its result
+        queued, with no move or change left to send.
+        """
+        return (
+            not self.game_state.is_game_running
+            and (not self.game_state.is_game_ended or self.match_result_sent)
+            and not self.inputs.pending
+            and not self.game_state.has_changes()
+        )
+
+    def apply_inputs(self):
+        # Runs without awaiting, so it needs no lock against the tick loop
+        if self.game_state.is_game_running:
+            self.inputs.apply(self.engine)
+        else:
+            self.inputs.drain()  # Moves made while paused are dropped
+
+    async def update_game_state(self):
         try:
             async with self.lock:
                 if self.game_state.is_game_running:
-                    engine = PongGameEngine(self.game_state)
-                    self.game_state = engine.update_game_state()
-                    logger.debug(f"Updated game state for game_id: {self.game_id}")
-                if self.game_state.is_game_ended:
-                    logger.debug(f"Ending game state for game_id: {self.game_id}")
-                    await self.send_game_result_to_matchmaking()
-                    await self.send_connection_close(channel_layer, game_group_name)
+                    self.engine.step()
+                    # Runs every tick: lazy %-formatting, not an f-string
+                    logger.debug("Updated game state for game_id: %s", self.game_id)
         except Exception as e:
             logger.error(f"Error updating game state: {str(e)}", exc_info=True)
 
-    def calculate_diffs(self, current_state, previous_state):
-        diffs = {}
-        for key, value in current_state.__dict__.items():
-            if not key.startswith("_"):
-                prev_value = getattr(previous_state, key, None)
-                if prev_value != value:
-                    diffs[key] = value
-                    logger.debug(f"Detected change in {key}: {prev_value} -> {value}")
-        return diffs
-
-    async def send_full_game_state(self, channel_layer, game_group_name):
-        try:
-            async with self.lock:
-                game_state_data = {
-                    key: value
-                    for key, value in self.game_state.__dict__.items()
-                    if not key.startswith("_")
-                }
-                compressed_data = zlib.compress(json.dumps(game_state_data).encode())
-                encoded_data = base64.b64encode(compressed_data).decode()
-
-                await channel_layer.group_send(
-                    game_group_name,
-                    {"type": "game_state_update", "state": encoded_data},
-                )
-                logger.debug(
-                    f"Sent full game state to group: {game_group_name} for game_id: {self.game_id}"
-                )
-        except Exception as e:
-            logger.error(
-                f"Error sending full game state to clients: {str(e)}", exc_info=True
-            )
-
-    async def send_partial_game_state(self, channel_layer, game_group_name):
+    async def end_game(self, channel_layer, game_group_name):
+        """
+        Queues the result of an ended game and closes its sockets. Runs once,
+        after the tick that ended the game broadcast the final score.
+        """
+        if self.match_result_sent:
+            return
+        logger.debug(f"Ending game state for game_id: {self.game_id}")
+        self.match_result_sent = True
+        # The Redis round trips run beside the tick loop, which would
+        # otherwise stall every game behind them
+        self.result_task = asyncio.create_task(
+            self.send_game_result_to_matchmaking(self.build_game_result())
+        )
+        await self.send_connection_close(channel_layer, game_group_name)
+
+    async def build_partial_game_state(self):
+        """Returns the game_state_update message for this tick, or None."""
         try:
             async with self.lock:
-                if self.previous_game_state is None:
-                    self.previous_game_state = copy.deepcopy(
-                        self.game_state
-                    )  # Initialize previous state if None
-
-                diffs = self.calculate_diffs(self.game_state, self.previous_game_state)
-                if diffs:
-                    compressed_data = zlib.compress(json.dumps(diffs).encode())
-                    encoded_data = base64.b64encode(compressed_data).decode()
-
-                    await channel_layer.group_send(
-                        game_group_name,
-                        {"type": "game_state_update", "state": encoded_data},
-                    )
-                    logger.debug(
-                        f"Sent game state diffs to group: {game_group_name} for game_id: {self.game_id}"
-                    )
-                self.previous_game_state = copy.deepcopy(
-                    self.game_state
-                )  # Update previous state
+                frame = self.encoder.encode(self.game_state)
+                if frame is None:
+                    return None
+                return build_frame_event(frame)
         except Exception as e:
-            logger.error(
-                f"Error sending partial game state to clients: {str(e)}", exc_info=True
-            )
+            logger.error(f"Error building partial game state: {str(e)}", exc_info=True)
+            return None
+
+    async def build_snapshot(self, timestamp=False):
+        """
+        Returns a keyframe event of the current state tagged with the seq of
+        the last diff, for a single client joining or resynchronising.
+        Spectator frames are timestamped so viewers can interpolate.
+        """
+        async with self.lock:
+            frame = self.encoder.snapshot(self.game_state)
+        if timestamp:
+            frame["time"] = int(time.time() * 1000)
+        return build_frame_event(frame)
 
     async def start_periodic_updates(self, channel_layer, game_group_name):
-        if self.periodic_task is None:
-            self.periodic_task = asyncio.create_task(
-                self._periodic_updates(channel_layer, game_group_name)
-            )
+        scheduler = TickScheduler()
+        if not scheduler.is_registered(self):
+            scheduler.register(self, channel_layer, game_group_name)
+            Checkpointer().start()
             logger.debug(f"Started periodic updates for game_id: {self.game_id}")
+        else:
+            scheduler.wake(self.game_id)  # A client joined a parked game
 
     async def send_connection_close(self, channel_layer, game_group_name):
         try:
-            await channel_layer.group_send(
-                game_group_name,
-                {"type": "connection_closed"},
-            )
+            for group_name in (game_group_name, f"{game_group_name}_spectators"):
+                await channel_layer.group_send(
+                    group_name,
+                    {"type": "connection_closed"},
+                )
             logger.debug(
                 f"Sent full game state to group: {game_group_name} for game_id: {self.game_id}"
             )
@@ -160,77 +199,52 @@ class GameStateManager:
                 exc_info=True,
             )
 
-    async def _periodic_updates(self, channel_layer, game_group_name):
-        try:
-            while True:
-                await self.update_game_state(channel_layer, game_group_name)
-                logger.debug("Game updated now send")
-                await self.send_partial_game_state(channel_layer, game_group_name)
-                await asyncio.sleep(1 / 40)
-        except asyncio.CancelledError:
-            pass
-        logger.debug(f"Stopped periodic updates for game_id: {self.game_id}")
-
     async def stop_periodic_updates(self):
-        if self.periodic_task is not None:
-            self.periodic_task.cancel()
-            self.periodic_task = None
+        scheduler = TickScheduler()
+        if scheduler.is_registered(self):
+            scheduler.unregister(self)
+            # Nobody is connected any more, keep the latest state
+            await Checkpointer().checkpoint([self])
             logger.debug(f"Stopped periodic updates for game_id: {self.game_id}")
 
-    async def send_game_result_to_matchmaking(self):
-        """Sends game result to matchmaking service when game ends"""
-        if not self.match_result_sent:
-            self.match_result_sent = True
-            logger.debug(f"Preparing to send game result for game {self.game_id}")
-            matchmaking_url = (
-                f"http://matchmaking:8000/api/match/{self.game_id}/result/"
+    def build_game_result(self):
+        # Determine the winner based on the player with the most goals
+        if self.game_state.player_1_score > self.game_state.player_2_score:
+            winner_id = self.game_state.player_1_id
+        elif self.game_state.player_2_score > self.game_state.player_1_score:
+            winner_id = self.game_state.player_2_id
+        else:
+            winner_id = None  # It's a tie
+
+        game_result = {
+            "winner_id": winner_id,
+            "player_1_score": self.game_state.player_1_score,
+            "player_2_score": self.game_state.player_2_score,
+            "start_time": self.game_start_time.isoformat(),
+            "end_time": timezone.now().isoformat(),
+        }
+        logger.debug(f"Game result data: {game_result}")
+        return game_result
+
+    async def send_game_result_to_matchmaking(self, game_result):
+        """
+        Hands the game result to the ResultOutbox when the game ends. Runs as
+        its own task: only Redis writes happen here, delivery to matchmaking
+        runs in the outbox's background sender.
+        """
+        try:
+            await ResultOutbox().enqueue(self.game_id, game_result)
+        except Exception as e:
+            # Queued again at the next tick
+            self.match_result_sent = False
+            TickScheduler().wake(self.game_id)
+            logger.error(
+                f"Error queueing game result for matchmaking: {str(e)}",
+                exc_info=True,
             )
-            logger.debug(f"Matchmaking URL: {matchmaking_url}")
-
-            # Determine the winner based on the player with the most goals
-            if self.game_state.player_1_score > self.game_state.player_2_score:
-                winner_id = self.game_state.player_1_id
-            elif self.game_state.player_2_score > self.game_state.player_1_score:
-                winner_id = self.game_state.player_2_id
-            else:
-                winner_id = None  # It's a tie
-
-            game_result = {
-                "winner_id": winner_id,
-                "player_1_score": self.game_state.player_1_score,
-                "player_2_score": self.game_state.player_2_score,
-                "start_time": self.game_start_time.isoformat(),
-                "end_time": timezone.now().isoformat(),
-            }
-            logger.debug(f"Game result data: {game_result}")
-
-            try:
-                logger.debug("Initiating HTTP request to matchmaking service")
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(
-                        matchmaking_url, json=game_result
-                    ) as response:
-                        response_text = await response.text()
-                        logger.debug(f"Matchmaking response: {response_text}")
-                        if response.status == 200:
-                            logger.debug(
-                                f"Game {self.game_id} result successfully sent to matchmaking. Response: {response_text}"
-                            )
-                            try:
-                                self.game_state.delete()
-                                logger.debug(
-                                    "Game successfully deleted from REDIS after ended"
-                                )
-                            except Exception as e:
-                                logger.warning(
-                                    f"Game could not be deleted after finished: {str(e)}"
-                                )
-                        else:
-                            logger.error(
-                                f"Failed to send game result. Status: {response.status}, Error: {response_text}"
-                            )
-            except Exception as e:
-                self.match_result_sent = False
-                logger.error(
-                    f"Error sending game result to matchmaking: {str(e)}", exc_info=True
-                )
+            return
+        try:
+            await self.delete_game_state()
+            logger.debug("Game successfully deleted from REDIS after ended")
+        except Exception as e:
+            logger.warning(f"Game could not be deleted after finished: {str(e)}")
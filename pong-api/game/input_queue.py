@@ -0,0 +1,47 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InputQueue:
+    """
+    Paddle inputs received since the last tick, one net direction per player.
+    Consumers push without taking the manager lock and the tick loop drains
+    the queue once per tick, so paddle speed no longer follows the rate at
+    which a client sends moves.
+    """
+
+    def __init__(self, max_steps):
+        self.max_steps = max_steps
+        self.pending = {}
+        self.received = 0
+        self.applied = 0
+
+    def push(self, player_id, direction):
+        if direction not in (1, -1):
+            return
+        self.pending[player_id] = self.pending.get(player_id, 0) + direction
+        self.received += 1
+
+    def drain(self):
+        """
+        Returns (player_id, direction, steps) for every player with a net
+        move, steps capped at max_steps, and empties the queue.
+        """
+        moves = []
+        for player_id, net in self.pending.items():
+            if net:
+                direction = 1 if net > 0 else -1
+                moves.append((player_id, direction, min(abs(net), self.max_steps)))
+        self.pending.clear()
+        return moves
+
+    def apply(self, engine):
+        """Moves the paddles by the queued inputs, returns the steps applied."""
+        steps = 0
+        for player_id, direction, count in self.drain():
+            for _ in range(count):
+                engine.move_player(player_id, direction)
+            steps += count
+        self.applied += steps
+        return steps
@@ -0,0 +1,159 @@
+import asyncio
+import time
+import logging
+from django.conf import settings
+from .checkpointer import Checkpointer
+from .presence import GamePresence
+from .repository import GameStateRepository
+from . import sharding
+from .tick_scheduler import TickScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class GameReaper:
+    """
+    Bounds the games kept by this worker. Every GAME_REAPER_INTERVAL seconds
+    it evicts the managers of ended games, of games without clients for
+    GAME_IDLE_TIMEOUT seconds and, past GAME_MAX_LIVE_GAMES, of the least
+    recently active games without clients. Evicted games are checkpointed and
+    their Redis state is left to expire after GAME_ABANDONED_TTL seconds
+    unless someone loads them again.
+
+    The sweep also reconciles Redis with the live managers: states of ended
+    games are deleted and states no manager held for GAME_IDLE_TIMEOUT
+    seconds get the same expiry, so games created by matchmaking have time
+    to be joined.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(GameReaper, cls).__new__(cls)
+            instance.__init__()
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "initialized"):
+            return
+        self.interval = settings.GAME_REAPER_INTERVAL
+        self.idle_timeout = settings.GAME_IDLE_TIMEOUT
+        self.max_live_games = settings.GAME_MAX_LIVE_GAMES
+        self.abandoned_ttl = settings.GAME_ABANDONED_TTL
+        self.repository = GameStateRepository()
+        self.task = None
+        self.evicted = {"ended": 0, "idle": 0, "capacity": 0}
+        self.deleted_keys = 0
+        self.expiring_keys = 0
+        # When reconcile first saw a stored game without a manager
+        self.unclaimed = {}
+        self.initialized = True
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+            logger.debug("Started game reaper")
+
+    async def _run(self):
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                try:
+                    await self.sweep()
+                except Exception as e:
+                    logger.error(f"Game reaper sweep failed: {e}", exc_info=True)
+        except asyncio.CancelledError:
+            pass
+
+    def has_clients(self, manager):
+        return bool(GamePresence().local_count(manager.game_id) or manager.spectators)
+
+    async def sweep(self):
+        from .game_state_manager import GameStateManager
+
+        # Victims are picked, unscheduled and removed without awaiting in
+        # between, so a client connecting meanwhile gets a fresh manager and
+        # registration instead of one being torn down
+        now = time.monotonic()
+        victims = []
+        for manager in GameStateManager._instances.values():
+            if manager.game_state.is_game_ended:
+                if manager.match_result_sent:
+                    victims.append((manager, "ended"))
+            elif (
+                not self.has_clients(manager)
+                and now - manager.last_activity >= self.idle_timeout
+            ):
+                victims.append((manager, "idle"))
+        scheduler = TickScheduler()
+        for manager, _ in victims:
+            if scheduler.is_registered(manager):
+                scheduler.unregister(manager)
+            del GameStateManager._instances[manager.game_id]
+
+        overflow = len(GameStateManager._instances) - self.max_live_games
+        if overflow > 0:
+            unattended = sorted(
+                (
+                    manager
+                    for manager in GameStateManager._instances.values()
+                    if not self.has_clients(manager)
+                ),
+                key=lambda manager: manager.last_activity,
+            )
+            for manager in unattended[:overflow]:
+                if scheduler.is_registered(manager):
+                    scheduler.unregister(manager)
+                del GameStateManager._instances[manager.game_id]
+                victims.append((manager, "capacity"))
+
+        for manager, reason in victims:
+            await self.evict(manager, reason)
+        await self.reconcile()
+
+    async def evict(self, manager, reason):
+        """Tears down a manager already removed from the live games."""
+        if not manager.game_state.is_game_ended:
+            await Checkpointer().checkpoint([manager])
+            await self.repository.expire(manager.game_id, self.abandoned_ttl)
+            await sharding.expire(manager.game_id, self.abandoned_ttl)
+        self.evicted[reason] += 1
+        logger.debug(f"Evicted game {manager.game_id} ({reason})")
+
+    async def reconcile(self):
+        from .game_state_manager import GameStateManager
+
+        now = time.monotonic()
+        unclaimed = {}
+        for game_id in await self.repository.game_ids():
+            if game_id in GameStateManager._instances:
+                continue
+            if not await sharding.is_owned(game_id):
+                continue
+            game_state = await self.repository.load(game_id)
+            if game_state is None:
+                continue
+            if game_state.is_game_ended:
+                await self.repository.delete(game_id)
+                await sharding.release(game_id)
+                self.deleted_keys += 1
+                continue
+            unclaimed[game_id] = self.unclaimed.get(game_id, now)
+            if now - unclaimed[game_id] < self.idle_timeout:
+                continue  # E.g. created by matchmaking and not joined yet
+            if await self.repository.expire(game_id, self.abandoned_ttl):
+                await sharding.expire(game_id, self.abandoned_ttl)
+                self.expiring_keys += 1
+        self.unclaimed = unclaimed
+
+    def stats(self):
+        from .game_state_manager import GameStateManager
+
+        return {
+            "live_games": len(GameStateManager._instances),
+            "evicted": dict(self.evicted),
+            "deleted_keys": self.deleted_keys,
+            "expiring_keys": self.expiring_keys,
+        }
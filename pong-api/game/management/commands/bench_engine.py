@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import time
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from game.engine import tracing
+from game.engine.pong_game_engine import PongGameEngine
+from game.game_state_manager import GameStateManager
+from game.metrics import TickMetrics
+from game.runtime_state import RuntimeGameState
+from game.tick_scheduler import TickScheduler
+
+# Ids of the games ticked by the scheduler benchmark, far above real ones
+BENCH_GAME_ID = 10**9
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark of the per-tick engine cost: a new PongGameEngine per "
+        "tick against one long-lived engine per game, and the cost of tracing "
+        "one game and of swept collisions. Then whole scheduler ticks over "
+        "--games games with the scalar and the batch physics backends."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ticks", type=int, default=200000)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--games", type=int, default=1000)
+        parser.add_argument("--scheduler-ticks", type=int, default=200)
+
+    def new_state(self):
+        return RuntimeGameState(
+            id=1, player_1_id=1, player_2_id=2, is_game_running=True, max_score=10**9
+        )
+
+    def run_per_tick_engine(self, ticks):
+        game_state = self.new_state()
+        started = time.perf_counter()
+        for _ in range(ticks):
+            game_state = PongGameEngine(game_state).update_game_state()
+            game_state.is_game_running = True
+        return time.perf_counter() - started
+
+    def run_persistent_engine(self, ticks):
+        game_state = self.new_state()
+        engine = PongGameEngine(game_state)
+        step = engine.step
+        started = time.perf_counter()
+        for _ in range(ticks):
+            step()
+            game_state.is_game_running = True
+        return time.perf_counter() - started
+
+    def run_traced_engine(self, ticks):
+        # Records are built but dropped, this measures tracing, not log I/O
+        trace_logger = logging.getLogger(tracing.__name__)
+        handlers, propagate = trace_logger.handlers, trace_logger.propagate
+        trace_logger.handlers, trace_logger.propagate = [logging.NullHandler()], False
+        tracing.enable(1)
+        try:
+            return self.run_persistent_engine(ticks)
+        finally:
+            tracing.disable(1)
+            trace_logger.handlers, trace_logger.propagate = handlers, propagate
+
+    def run_swept_engine(self, ticks):
+        with override_settings(GAME_COLLISION_MODE="swept"):
+            return self.run_persistent_engine(ticks)
+
+    async def run_scheduler(self, games, ticks):
+        scheduler = TickScheduler()
+        channel_layer = InMemoryChannelLayer()
+        managers = [
+            GameStateManager(game_id, self.new_state())
+            for game_id in range(BENCH_GAME_ID, BENCH_GAME_ID + games)
+        ]
+        try:
+            for manager in managers:
+                scheduler.register(manager, channel_layer, f"bench_{manager.game_id}")
+            # The benchmark drives _tick itself, not the scheduler's loop
+            scheduler.task.cancel()
+            elapsed = 0.0
+            for _ in range(ticks):
+                started = time.perf_counter()
+                await scheduler._tick(1)
+                elapsed += time.perf_counter() - started
+                for manager in managers:
+                    if not manager.game_state.is_game_running:
+                        await manager.toggle_game()  # Serve again after a goal
+            return elapsed, scheduler.metrics.phases["update"].sum
+        finally:
+            for manager in managers:
+                scheduler.unregister(manager)
+                GameStateManager._instances.pop(manager.game_id, None)
+
+    def run_tick(self, backend, games, ticks):
+        """Returns the seconds spent in whole ticks and in their physics."""
+        # A scheduler of its own, timing the phases of every tick
+        singletons = TickScheduler._instance, TickMetrics._instance
+        TickScheduler._instance = TickMetrics._instance = None
+        try:
+            with override_settings(
+                GAME_PHYSICS_BACKEND=backend, GAME_METRICS_SAMPLE_INTERVAL=1
+            ):
+                return asyncio.run(self.run_scheduler(games, ticks))
+        finally:
+            TickScheduler._instance, TickMetrics._instance = singletons
+
+    def handle(self, *args, **options):
+        ticks = options["ticks"]
+        results = {}
+        for name, run in (
+            ("engine per tick", self.run_per_tick_engine),
+            ("persistent engine", self.run_persistent_engine),
+            ("traced engine", self.run_traced_engine),
+            ("swept engine", self.run_swept_engine),
+        ):
+            best = min(run(ticks) for _ in range(options["repeat"]))
+            results[name] = best
+            self.stdout.write(f"{name:>18}: {best / ticks * 1e9:8.0f} ns/tick")
+        speedup = results["engine per tick"] / results["persistent engine"]
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {speedup:.2f}x"))
+        overhead = results["traced engine"] / results["persistent engine"]
+        self.stdout.write(f"Tracing overhead: {overhead:.2f}x")
+        swept = results["swept engine"] / results["persistent engine"]
+        self.stdout.write(f"Swept collisions cost: {swept:.2f}x per step")
+
+        games, ticks = options["games"], options["scheduler_ticks"]
+        for backend in ("scalar", "batch"):
+            tick, physics = min(
+                self.run_tick(backend, games, ticks) for _ in range(options["repeat"])
+            )
+            results[backend], results[f"{backend} physics"] = tick, physics
+            self.stdout.write(
+                f"{backend + ' tick':>18}: {tick / ticks * 1e3:8.3f} ms/tick, "
+                f"{physics / ticks * 1e3:.3f} ms physics ({games} games)"
+            )
+        gain = results["scalar"] / results["batch"]
+        physics_gain = results["scalar physics"] / results["batch physics"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Batch speedup: {gain:.2f}x per tick, {physics_gain:.2f}x physics"
+            )
+        )
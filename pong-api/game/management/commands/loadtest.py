@@ -0,0 +1,321 @@
+import asyncio
+import base64
+import copy
+import json
+import statistics
+import threading
+import time
+import tracemalloc
+import zlib
+from contextlib import ExitStack, contextmanager
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from game import protocol
+from game.game_state_manager import GameStateManager
+from game.models import GameState
+from game.repository import GameStateRepository
+from game.routing import websocket_urlpatterns
+from game.runtime_state import GAME_STATE_FIELDS
+from game.tick_scheduler import TickScheduler
+from game.views import CreateGame
+from game import sharding
+
+IN_MEMORY_LAYER = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class LoadClient:
+    """
+    One player socket speaking the real protocol: it mirrors the game state
+    from keyframes and diffs, sends a paddle sweep at `move_rate` moves per
+    second and times each move until its paddle is seen moving. Player 1
+    also toggles the game back on after every point.
+    """
+
+    def __init__(self, application, game_id, player, move_rate, binary):
+        self.game_id = game_id
+        self.player = player
+        self.position_field = f"player_{player}_position"
+        self.move_interval = 1 / move_rate
+        self.binary = binary
+        self.communicator = WebsocketCommunicator(
+            application,
+            f"/ws/game/{game_id}/",
+            subprotocols=[protocol.BINARY_SUBPROTOCOL] if binary else [],
+        )
+        self.state = {}
+        self.frames = 0
+        self.bytes = 0
+        self.arrivals = []
+        self.latencies = []
+        self.pending_move = None
+        self.toggle_sent = False
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect(timeout=10)
+        if not connected:
+            raise CommandError(f"Socket for game {self.game_id} was rejected")
+
+    async def run(self, stop):
+        await asyncio.gather(self.receive_frames(stop), self.send_moves(stop))
+
+    def decode(self, output):
+        if output.get("bytes") is not None:
+            self.bytes += len(output["bytes"])
+            return protocol.decode_binary_frame(output["bytes"])
+        self.bytes += len(output["text"])
+        message = json.loads(output["text"])
+        if message.get("type") != "game_state_update":
+            return None
+        return json.loads(zlib.decompress(base64.b64decode(message["state"])))
+
+    async def receive_frames(self, stop):
+        while not stop.is_set():
+            try:
+                output = await self.communicator.receive_output(timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            if output["type"] == "websocket.close":
+                return
+            received = time.perf_counter()
+            frame = self.decode(output)
+            if frame is None:
+                continue
+            self.frames += 1
+            self.arrivals.append(received)
+            previous = self.state.get(self.position_field)
+            if frame.get("keyframe"):
+                self.state = dict(zip(frame["fields"], frame["state"]))
+            else:
+                for field_id, value in frame["diff"].items():
+                    self.state[GAME_STATE_FIELDS[int(field_id)]] = value
+            if (
+                self.pending_move is not None
+                and self.state.get(self.position_field) != previous
+            ):
+                self.latencies.append(received - self.pending_move)
+                self.pending_move = None
+            await self.restart_after_point()
+
+    async def restart_after_point(self):
+        if self.player != 1 or self.state.get("is_game_ended"):
+            return
+        if self.state.get("is_game_running"):
+            self.toggle_sent = False
+        elif not self.toggle_sent:
+            self.toggle_sent = True
+            await self.send({"action": "toggle"})
+
+    async def send_moves(self, stop):
+        moves = 0
+        while not stop.is_set():
+            await asyncio.sleep(self.move_interval)
+            # Sweep the paddle up and down so it rarely sits at a wall
+            direction = 1 if (moves // 20) % 2 == 0 else -1
+            moves += 1
+            if not self.state:
+                continue  # Player ids come with the join keyframe
+            if self.pending_move is None and self.state.get("is_game_running"):
+                self.pending_move = time.perf_counter()
+            await self.send(
+                {
+                    "action": "move",
+                    "player_id": self.state.get(f"player_{self.player}_id"),
+                    "direction": direction,
+                }
+            )
+
+    async def send(self, message):
+        await self.communicator.send_to(text_data=json.dumps(message))
+
+
+class Command(BaseCommand):
+    help = (
+        "Headless load generator: creates N games through the CreateGame view, "
+        "plays them with 2*N in-process WebSocket clients for a while and "
+        "reports tick jitter, input-to-frame latency, CPU and memory per game."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--games", type=int, default=10)
+        parser.add_argument("--duration", type=float, default=10.0)
+        parser.add_argument(
+            "--move-rate",
+            type=float,
+            default=50.0,
+            help="Moves per second sent by each client",
+        )
+        parser.add_argument("--binary", action="store_true")
+        parser.add_argument("--sim-rate", type=int, help="sim_rate of the games")
+        parser.add_argument(
+            "--snapshot-rate", type=int, help="snapshot_rate of the games"
+        )
+        parser.add_argument(
+            "--first-id",
+            type=int,
+            default=1000000,
+            help="Id of the first game, the run uses the next N ids",
+        )
+        parser.add_argument(
+            "--redis-layer",
+            action="store_true",
+            help="Use the configured channel layer instead of an in-memory one",
+        )
+        parser.add_argument(
+            "--fake-redis",
+            action="store_true",
+            help="Serve Redis from fakeredis in this process instead of the "
+            "configured server",
+        )
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            if options["fake_redis"]:
+                stack.enter_context(self.fake_redis())
+            if not options["redis_layer"]:
+                stack.enter_context(override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYER))
+            asyncio.run(self.load_test(options))
+
+    @contextmanager
+    def fake_redis(self):
+        """Points the cache, the game and the channel layer at a fakeredis server."""
+        try:
+            from fakeredis import TcpFakeServer
+        except ImportError:
+            raise CommandError("--fake-redis needs the fakeredis package")
+        server = TcpFakeServer(("127.0.0.1", 0))
+        server.daemon_threads = True  # Connections left open do not block exit
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        host, port = server.server_address
+        url = f"redis://{host}:{port}/1"
+        caches = copy.deepcopy(settings.CACHES)
+        caches["default"]["LOCATION"] = url
+        layers = copy.deepcopy(settings.CHANNEL_LAYERS)
+        layers["default"].get("CONFIG", {})["hosts"] = [(host, port)]
+        try:
+            with override_settings(
+                CACHES=caches, GAME_REDIS_URL=url, CHANNEL_LAYERS=layers
+            ):
+                yield
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def create_games(self, game_ids, options):
+        factory = APIRequestFactory()
+        view = CreateGame.as_view()
+        for game_id in game_ids:
+            data = {
+                "id": game_id,
+                "max_score": 1000000,
+                "player_1_id": 1,
+                "player_1_name": "Load 1",
+                "player_2_id": 2,
+                "player_2_name": "Load 2",
+            }
+            for rate in ("sim_rate", "snapshot_rate"):
+                if options[rate]:
+                    data[rate] = options[rate]
+            response = view(factory.post("/game/create_game/", data, format="json"))
+            if response.status_code != 201:
+                raise CommandError(f"Game {game_id} not created: {response.data}")
+
+    def delete_games(self, game_ids):
+        for game_id in game_ids:
+            sharding.release_worker(game_id)
+        GameState.objects.filter(id__in=game_ids).delete()
+
+    async def load_test(self, options):
+        games = options["games"]
+        game_ids = list(range(options["first_id"], options["first_id"] + games))
+        await sync_to_async(self.create_games)(game_ids, options)
+        application = URLRouter(websocket_urlpatterns)
+
+        tracemalloc.start()
+        clients = [
+            LoadClient(
+                application, game_id, player, options["move_rate"], options["binary"]
+            )
+            for game_id in game_ids
+            for player in (1, 2)
+        ]
+        try:
+            for client in clients:
+                await client.connect()
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            stop = asyncio.Event()
+            runs = [asyncio.create_task(client.run(stop)) for client in clients]
+            started, cpu_started = time.perf_counter(), time.process_time()
+            await asyncio.sleep(options["duration"])
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+            stop.set()
+            await asyncio.gather(*runs, return_exceptions=True)
+            scheduler_stats = TickScheduler().stats()
+            for client in clients:
+                await client.communicator.disconnect()
+        finally:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            repository = GameStateRepository()
+            for game_id in game_ids:
+                manager = GameStateManager._instances.pop(game_id, None)
+                if manager is not None:
+                    await manager.stop_periodic_updates()
+                await repository.delete(game_id)
+            await sync_to_async(self.delete_games)(game_ids)
+
+        snapshot_rate = options["snapshot_rate"] or settings.GAME_SNAPSHOT_RATE
+        interval = 1 / min(snapshot_rate, scheduler_stats["tick_rate"])
+        self.report(clients, games, elapsed, cpu, memory, scheduler_stats, interval)
+
+    def report(self, clients, games, elapsed, cpu, memory, scheduler_stats, interval):
+        deviations = []
+        for client in clients:
+            deviations += [
+                abs(later - earlier - interval)
+                for earlier, later in zip(client.arrivals, client.arrivals[1:])
+            ]
+        latencies = [latency for client in clients for latency in client.latencies]
+        frames = sum(client.frames for client in clients)
+        received = sum(client.bytes for client in clients)
+
+        self.stdout.write(f"{games} games, {len(clients)} clients, {elapsed:.1f} s")
+        self.stdout.write(
+            f"Frames received: {frames / elapsed:,.0f}/s, {received / elapsed / 1024:,.1f} KiB/s"
+        )
+        self.stdout.write(
+            "Frame jitter: "
+            f"mean {statistics.fmean(deviations or [0]) * 1000:.2f} ms, "
+            f"p99 {percentile(deviations, 0.99) * 1000:.2f} ms"
+        )
+        self.stdout.write(
+            f"Tick loop: {scheduler_stats['ticks']} ticks, "
+            f"{scheduler_stats['overruns']} overruns, "
+            f"{scheduler_stats['dropped_ticks']} dropped, "
+            f"max tick {scheduler_stats['max_tick_duration'] * 1000:.2f} ms"
+        )
+        self.stdout.write(
+            "Input latency: "
+            f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms "
+            f"({len(latencies)} samples)"
+        )
+        # Clients run in this process too, so both figures include them
+        self.stdout.write(
+            f"CPU per game: {cpu / elapsed / games * 100:.2f}% of a core, "
+            f"memory per game: {memory / games / 1024:.1f} KiB"
+        )
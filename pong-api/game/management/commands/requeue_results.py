@@ -0,0 +1,14 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from game.result_outbox import ResultOutbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Schedules the game results moved to the dead-letter set for delivery "
+        "to matchmaking again, e.g. after an outage longer than the retries."
+    )
+
+    def handle(self, *args, **options):
+        requeued = asyncio.run(ResultOutbox().requeue_dead_letters())
+        self.stdout.write(self.style.SUCCESS(f"Requeued {requeued} game results"))
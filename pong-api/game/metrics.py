@@ -0,0 +1,241 @@
+import bisect
+import logging
+from collections import defaultdict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds, a tick has a budget of 1 / GAME_TICK_RATE = 25 ms
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+)
+PHASES = ("inputs", "update", "encode", "fanout", "tick")
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed upper bounds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels=""):
+        separator = "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(
+                f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}'
+            )
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class TickMetrics:
+    """
+    Instrumentation of the tick loop. Phase durations and tick lag are only
+    timed every GAME_METRICS_SAMPLE_INTERVAL ticks (0 turns timing off), so
+    they cost a few perf_counter() calls per sampled tick. Frame and byte
+    counters are plain integer additions and always on.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(TickMetrics, cls).__new__(cls)
+            instance.__init__()
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "initialized"):
+            return
+        self.sample_interval = settings.GAME_METRICS_SAMPLE_INTERVAL
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.lag = Histogram()
+        self.frames = defaultdict(int)
+        self.frame_bytes = defaultdict(int)
+        self.initialized = True
+
+    def is_sampled(self, tick):
+        return self.sample_interval > 0 and tick % self.sample_interval == 0
+
+    def observe(self, phase, seconds):
+        self.phases[phase].observe(seconds)
+
+    def count_frame(self, game_id, message):
+        self.frames[game_id] += 1
+        self.frame_bytes[game_id] += len(message["bytes"])
+
+    def forget(self, game_id):
+        self.frames.pop(game_id, None)
+        self.frame_bytes.pop(game_id, None)
+
+    def render(self):
+        lines = [
+            "# HELP pong_tick_phase_seconds Duration of the phases of sampled ticks.",
+            "# TYPE pong_tick_phase_seconds histogram",
+        ]
+        for phase, histogram in self.phases.items():
+            lines += histogram.render("pong_tick_phase_seconds", f'phase="{phase}"')
+        lines += [
+            "# HELP pong_tick_lag_seconds Delay of sampled ticks behind their deadline.",
+            "# TYPE pong_tick_lag_seconds histogram",
+        ]
+        lines += self.lag.render("pong_tick_lag_seconds")
+        lines += [
+            "# HELP pong_game_frames_total Frames broadcast per game.",
+            "# TYPE pong_game_frames_total counter",
+        ]
+        for game_id, frames in self.frames.items():
+            lines.append(f'pong_game_frames_total{{game_id="{game_id}"}} {frames}')
+        lines += [
+            "# HELP pong_game_frame_bytes_total Encoded (binary) bytes broadcast per game.",
+            "# TYPE pong_game_frame_bytes_total counter",
+        ]
+        for game_id, size in self.frame_bytes.items():
+            lines.append(f'pong_game_frame_bytes_total{{game_id="{game_id}"}} {size}')
+        return lines
+
+
+def metric(name, value, help_text, kind="gauge"):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+
+
+def render():
+    """
+    Prometheus text exposition of the tick loop and of the other game
+    components of this process. Components that never started are skipped
+    rather than created.
+    """
+    from channels.layers import get_channel_layer
+    from .checkpointer import Checkpointer
+    from .game_state_manager import GameStateManager
+    from .lifecycle import GameReaper
+    from .rate_limit import InputGuard
+    from .result_outbox import ResultOutbox
+    from .tick_scheduler import TickScheduler
+
+    lines = TickMetrics().render()
+
+    scheduler = TickScheduler._instance
+    if scheduler is not None:
+        stats = scheduler.stats()
+        lines += metric(
+            "pong_scheduled_games", stats["games"], "Games in the tick loop."
+        )
+        lines += metric(
+            "pong_parked_games", stats["parked"], "Stopped games skipped by ticks."
+        )
+        lines += metric("pong_ticks_total", stats["ticks"], "Ticks run.", "counter")
+        lines += metric(
+            "pong_tick_overruns_total",
+            stats["overruns"],
+            "Ticks that started late.",
+            "counter",
+        )
+        lines += metric(
+            "pong_dropped_ticks_total",
+            stats["dropped_ticks"],
+            "Ticks skipped beyond the catch-up bound.",
+            "counter",
+        )
+        lines += metric(
+            "pong_tick_lag_last_seconds", stats["lag"], "Lag of the last tick."
+        )
+
+    lines += metric(
+        "pong_input_queue_depth",
+        sum(len(m.inputs.pending) for m in GameStateManager._instances.values()),
+        "Players with moves waiting for the next tick.",
+    )
+    for name, value in InputGuard.stats().items():
+        lines += metric(
+            f"pong_input_{name}_total",
+            value,
+            f"Game socket messages {name}.",
+            "counter",
+        )
+
+    layer = get_channel_layer()
+    if hasattr(layer, "local_queues"):
+        stats = layer.stats()
+        lines += metric(
+            "pong_channel_local_queue_depth",
+            sum(queue.qsize() for queue in layer.local_queues.values()),
+            "Messages waiting in the in-process channel queues.",
+        )
+        lines += metric(
+            "pong_channel_local_deliveries_total",
+            stats["local_deliveries"],
+            "Group messages delivered in process.",
+            "counter",
+        )
+        lines += metric(
+            "pong_channel_remote_deliveries_total",
+            stats["remote_deliveries"],
+            "Group messages sent through Redis.",
+            "counter",
+        )
+
+    checkpointer = Checkpointer._instance
+    if checkpointer is not None:
+        stats = checkpointer.stats()
+        lines += metric(
+            "pong_checkpoints_total", stats["checkpoints"], "Checkpoints.", "counter"
+        )
+        lines += metric(
+            "pong_checkpoint_failures_total",
+            stats["failures"],
+            "Failed checkpoints.",
+            "counter",
+        )
+        lines += metric(
+            "pong_checkpoint_last_seconds",
+            stats["last_duration"],
+            "Duration of the last checkpoint.",
+        )
+        lines += metric(
+            "pong_checkpoint_last_bytes",
+            stats["last_size"],
+            "Size of the last checkpoint.",
+        )
+
+    lines += metric(
+        "pong_live_games", len(GameStateManager._instances), "Games held in memory."
+    )
+    reaper = GameReaper._instance
+    if reaper is not None:
+        lines.append("# HELP pong_evicted_games_total Games evicted from memory.")
+        lines.append("# TYPE pong_evicted_games_total counter")
+        for reason, count in reaper.stats()["evicted"].items():
+            lines.append(f'pong_evicted_games_total{{reason="{reason}"}} {count}')
+
+    outbox = ResultOutbox._instance
+    if outbox is not None:
+        lines.append("# HELP pong_game_results_total Game results by outcome.")
+        lines.append("# TYPE pong_game_results_total counter")
+        for outcome, count in outbox.stats().items():
+            lines.append(f'pong_game_results_total{{outcome="{outcome}"}} {count}')
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('game', '0017_alter_gamestate_move_step'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gamestate',
+            name='sim_rate',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='gamestate',
+            name='snapshot_rate',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
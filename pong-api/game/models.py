@@ -20,6 +20,10 @@ class GameState(models.Model):
     paddle_width = models.IntegerField(default=2)
     paddle_offset = models.IntegerField(default=1)
     move_step = models.FloatField(default=0.5)
+    # Physics steps and frames per second, None uses the GAME_SIM_RATE and
+    # GAME_SNAPSHOT_RATE settings
+    sim_rate = models.PositiveIntegerField(null=True, blank=True)
+    snapshot_rate = models.PositiveIntegerField(null=True, blank=True)
 
     # Players
     player_1_id = models.IntegerField(null=True, blank=True)
@@ -70,6 +74,8 @@ class GameState(models.Model):
             "paddle_width": self.paddle_width,
             "paddle_offset": self.paddle_offset,
             "move_step": self.move_step,
+            "sim_rate": self.sim_rate,
+            "snapshot_rate": self.snapshot_rate,
         }
         packed_data = msgpack.packb(game_state_data)
         cache.set(cache_key, packed_data, timeout=None)
@@ -0,0 +1,89 @@
+import asyncio
+import time
+import logging
+from django.conf import settings
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def presence_key(game_id):
+    return f"game:{game_id}:presence"
+
+
+class GamePresence:
+    """
+    Tracks the WebSocket channels connected to each game in a Redis sorted
+    set scored by their last heartbeat. Joins and leaves update the set and
+    read its size in one transaction, so concurrent joins always see distinct
+    counts, and members whose process died stop counting after
+    GAME_PRESENCE_TTL seconds. One task per process refreshes the heartbeats
+    of all local members.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(GamePresence, cls).__new__(cls)
+            instance.__init__()
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "initialized"):
+            return
+        self.ttl = settings.GAME_PRESENCE_TTL
+        self.members = {}  # game_id: local channel names
+        self.task = None
+        self.initialized = True
+
+    async def _update(self, game_id, add=None, remove=None):
+        key = presence_key(game_id)
+        now = time.time()
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.zremrangebyscore(key, "-inf", now - self.ttl)
+            if add is not None:
+                pipe.zadd(key, {add: now})
+            if remove is not None:
+                pipe.zrem(key, remove)
+            pipe.expire(key, self.ttl * 2)
+            pipe.zcard(key)
+            results = await pipe.execute()
+        return results[-1]
+
+    async def join(self, game_id, channel_name):
+        """Adds the channel to the game, returns the number of members."""
+        self.members.setdefault(game_id, set()).add(channel_name)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._heartbeat())
+        return await self._update(game_id, add=channel_name)
+
+    async def leave(self, game_id, channel_name):
+        """Removes the channel from the game, returns the members left."""
+        members = self.members.get(game_id)
+        if members is not None:
+            members.discard(channel_name)
+            if not members:
+                del self.members[game_id]
+        return await self._update(game_id, remove=channel_name)
+
+    def local_count(self, game_id):
+        """Members of the game connected to this process."""
+        return len(self.members.get(game_id, ()))
+
+    async def _heartbeat(self):
+        try:
+            while self.members:
+                await asyncio.sleep(self.ttl / 3)
+                now = time.time()
+                async with get_redis().pipeline(transaction=False) as pipe:
+                    for game_id, members in self.members.items():
+                        key = presence_key(game_id)
+                        pipe.zadd(key, {channel: now for channel in members})
+                        pipe.expire(key, self.ttl * 2)
+                    await pipe.execute()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Presence heartbeat error: {e}", exc_info=True)
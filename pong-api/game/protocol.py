@@ -0,0 +1,110 @@
+"""
+Wire formats of the game WebSocket.
+
+TEXT_PROTOCOL (version 1) is the default: JSON text messages whose "state"
+is the frame JSON encoded, zlib compressed and base64 encoded.
+
+BINARY_PROTOCOL (version 2) is selected when the client offers the
+BINARY_SUBPROTOCOL WebSocket subprotocol. Every server message is a binary
+WebSocket message holding a msgpack array:
+
+    [protocol_version, message_type, seq, body]
+    [protocol_version, message_type, seq, body, ball]
+
+    MESSAGE_DIFF:              body is {field_id: value}
+    MESSAGE_KEYFRAME:          body is [[field_name, ...], [value, ...]], or
+                               [[field_name, ...], [value, ...], time] for
+                               spectator frames (server time in ms)
+    MESSAGE_CONNECTION_CLOSED: seq is 0 and body is None
+
+The second form is used by frames carrying a ball trajectory
+[x, y, vx, vy, time] (see DeltaEncoder), the text protocol puts it under
+the frame's "ball" key.
+
+Client messages (move, toggle) may be sent as JSON text in both protocols,
+or as a msgpack map in the binary one.
+"""
+
+import base64
+import json
+import zlib
+import msgpack
+
+TEXT_PROTOCOL = 1
+BINARY_PROTOCOL = 2
+BINARY_SUBPROTOCOL = "pong.msgpack.v2"
+
+MESSAGE_DIFF = 0
+MESSAGE_KEYFRAME = 1
+MESSAGE_CONNECTION_CLOSED = 2
+
+
+def negotiate(subprotocols):
+    """Returns (protocol, subprotocol to accept) for the offered subprotocols."""
+    if BINARY_SUBPROTOCOL in subprotocols:
+        return BINARY_PROTOCOL, BINARY_SUBPROTOCOL
+    return TEXT_PROTOCOL, None
+
+
+def encode_text_frame(frame):
+    compressed_data = zlib.compress(json.dumps(frame).encode())
+    encoded_data = base64.b64encode(compressed_data).decode()
+    return json.dumps({"type": "game_state_update", "state": encoded_data})
+
+
+def encode_binary_frame(frame):
+    if frame.get("keyframe"):
+        body = [list(frame["fields"]), frame["state"]]
+        if "time" in frame:
+            body.append(frame["time"])
+        message = [BINARY_PROTOCOL, MESSAGE_KEYFRAME, frame["seq"], body]
+    else:
+        diff = {int(field_id): value for field_id, value in frame["diff"].items()}
+        message = [BINARY_PROTOCOL, MESSAGE_DIFF, frame["seq"], diff]
+    if "ball" in frame:
+        message.append(frame["ball"])
+    return msgpack.packb(message)
+
+
+def decode_binary_frame(data):
+    """Inverse of encode_binary_frame, returns the frame dict (or None)."""
+    version, message_type, seq, body, *ball = msgpack.unpackb(
+        data, strict_map_key=False
+    )
+    if version != BINARY_PROTOCOL:
+        raise ValueError(f"Unsupported protocol version: {version}")
+    if message_type == MESSAGE_KEYFRAME:
+        frame = {"seq": seq, "keyframe": True, "fields": body[0], "state": body[1]}
+        if len(body) > 2:
+            frame["time"] = body[2]
+    elif message_type == MESSAGE_DIFF:
+        frame = {"seq": seq, "diff": body}
+    else:
+        return None
+    if ball:
+        frame["ball"] = ball[0]
+    return frame
+
+
+def build_frame_event(frame):
+    """
+    Channel layer event for a frame. Both wire encodings are built once here
+    by the producer; consumers forward the one their client negotiated.
+    """
+    return {
+        "type": "game_state_update",
+        "text": encode_text_frame(frame),
+        "bytes": encode_binary_frame(frame),
+    }
+
+
+def encode_connection_closed(protocol):
+    if protocol == BINARY_PROTOCOL:
+        return msgpack.packb([BINARY_PROTOCOL, MESSAGE_CONNECTION_CLOSED, 0, None])
+    return json.dumps({"type": "connection_closed"})
+
+
+def decode_client_message(text_data=None, bytes_data=None):
+    if bytes_data is not None:
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data)
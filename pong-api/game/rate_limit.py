@@ -0,0 +1,81 @@
+import time
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+ACCEPT = "accept"
+DROP = "drop"
+CLOSE = "close"
+
+# WebSocket close codes (RFC 6455)
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+
+class TokenBucket:
+    """Allows `rate` events per second on average, with bursts up to `burst`."""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+
+    def allow(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class InputGuard:
+    """
+    Screens the messages of one game socket before they are decoded. Frames
+    over GAME_MAX_MESSAGE_SIZE bytes close the socket, messages over the
+    GAME_INPUT_RATE / GAME_INPUT_BURST token bucket are dropped, and a client
+    that keeps flooding is closed after GAME_INPUT_MAX_DROPS drops.
+    """
+
+    # Totals over every socket of this process
+    totals = {"accepted": 0, "dropped": 0, "malformed": 0, "oversized": 0, "closed": 0}
+
+    def __init__(self):
+        self.bucket = TokenBucket(settings.GAME_INPUT_RATE, settings.GAME_INPUT_BURST)
+        self.max_size = settings.GAME_MAX_MESSAGE_SIZE
+        self.max_drops = settings.GAME_INPUT_MAX_DROPS
+        self.accepted = 0
+        self.dropped = 0
+
+    def check(self, text_data=None, bytes_data=None):
+        """Returns (verdict, close_code), close_code only set for CLOSE."""
+        data = bytes_data if bytes_data is not None else text_data
+        if data is None:
+            self.malformed()  # An empty frame, not worth a strike
+            return DROP, None
+        # Text frames are measured in characters, which saves encoding them
+        if len(data) > self.max_size:
+            self.totals["oversized"] += 1
+            self.totals["closed"] += 1
+            return CLOSE, CLOSE_MESSAGE_TOO_BIG
+        if not self.bucket.allow():
+            self.dropped += 1
+            self.totals["dropped"] += 1
+            if self.dropped >= self.max_drops:
+                self.totals["closed"] += 1
+                return CLOSE, CLOSE_POLICY_VIOLATION
+            return DROP, None
+        self.accepted += 1
+        self.totals["accepted"] += 1
+        return ACCEPT, None
+
+    def malformed(self):
+        self.totals["malformed"] += 1
+
+    @classmethod
+    def stats(cls):
+        return dict(cls.totals)
@@ -0,0 +1,22 @@
+import asyncio
+import logging
+import weakref
+import redis.asyncio as redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# One pooled client per event loop, asyncio connections cannot be shared
+# between loops
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_redis():
+    """Returns the async Redis client of the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = redis.from_url(settings.GAME_REDIS_URL)
+        _clients[loop] = client
+        logger.debug(f"Created async Redis client for {settings.GAME_REDIS_URL}")
+    return client
@@ -0,0 +1,106 @@
+import msgpack
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from .redis_client import get_redis
+from .runtime_state import RuntimeGameState
+
+logger = logging.getLogger(__name__)
+
+# Ids of the games written by a checkpoint, the only ones recovered after a
+# restart
+CHECKPOINTED_KEY = "game:checkpointed"
+
+
+class GameStateRepository:
+    """
+    Async access to the game states kept in the Redis cache, for consumers and
+    the game loop. Keys and values are built with the cache's own key function
+    and codec, so states written here are read by the sync cache API used in
+    the DRF views (and the other way round).
+    """
+
+    def key(self, game_id):
+        return cache.make_key(f"{game_id}")
+
+    def encode(self, game_state):
+        return cache.client.encode(msgpack.packb(game_state.to_dict()))
+
+    def decode(self, value):
+        return RuntimeGameState.from_dict(
+            msgpack.unpackb(cache.client.decode(value), raw=False)
+        )
+
+    async def load(self, game_id):
+        """Returns the RuntimeGameState of the game, or None."""
+        value = await get_redis().get(self.key(game_id))
+        if not value:
+            return None
+        try:
+            return self.decode(value)
+        except Exception as e:
+            logger.error(f"Error unpacking game_state_data: {e}")
+            raise
+
+    async def save(self, game_state):
+        if not game_state.id:
+            logger.warning("Attempting to save game state with no id!")
+        await get_redis().set(self.key(game_state.id), self.encode(game_state))
+        logger.debug(f"Saved game state to cache with key {game_state.id}")
+
+    async def save_many(self, game_states):
+        """
+        Saves several game states in one round trip and marks them
+        checkpointed, returns the bytes sent.
+        """
+        size = 0
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for game_state in game_states:
+                value = self.encode(game_state)
+                size += len(value)
+                pipe.set(self.key(game_state.id), value)
+            pipe.sadd(CHECKPOINTED_KEY, *(game_state.id for game_state in game_states))
+            await pipe.execute()
+        return size
+
+    async def checkpointed_ids(self):
+        """Ids of the games saved by save_many and not deleted since."""
+        return [
+            int(game_id) for game_id in await get_redis().smembers(CHECKPOINTED_KEY)
+        ]
+
+    async def forget(self, game_id):
+        """Drops the checkpoint marker of a game, its state is kept."""
+        await get_redis().srem(CHECKPOINTED_KEY, game_id)
+
+    async def game_ids(self):
+        """Ids of every game state stored in the cache."""
+        prefix = self.key("")
+        game_ids = []
+        async for key in get_redis().scan_iter(match=f"{prefix}*"):
+            game_id = key.decode()[len(prefix) :]
+            if game_id.isdigit():
+                game_ids.append(int(game_id))
+        return game_ids
+
+    async def expire(self, game_id, timeout):
+        """
+        Lets an abandoned game state expire after timeout seconds, unless an
+        expiry is already set. Returns whether the expiry was set.
+        """
+        return await get_redis().expire(self.key(game_id), timeout, nx=True)
+
+    async def is_expiring(self, game_id):
+        return await get_redis().ttl(self.key(game_id)) > 0
+
+    async def persist(self, game_id):
+        """Cancels the expiry of a game state that is played again."""
+        await get_redis().persist(self.key(game_id))
+
+    async def delete(self, game_id):
+        if settings.USE_REDIS:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                pipe.delete(self.key(game_id))
+                pipe.srem(CHECKPOINTED_KEY, game_id)
+                await pipe.execute()
+            logger.debug(f"Deleted game state from cache with key {game_id}")
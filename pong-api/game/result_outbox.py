@@ -0,0 +1,263 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+import logging
+import weakref
+import aiohttp
+from django.conf import settings
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_KEY = "game:results:outbox"
+DEAD_LETTERS_KEY = "game:results:dead"
+
+
+def result_key(game_id):
+    return f"game:{game_id}:result"
+
+
+# Returns the results due at ARGV[1] (at most ARGV[3]) and reserves them until
+# ARGV[2], so two workers never send the same result at once and a result
+# claimed by a worker that died is sent again once the lease runs out
+CLAIM_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[2], member)
+end
+return due
+"""
+
+# Responses worth retrying, every other 4xx is a rejected result
+RETRY_STATUSES = {408, 425, 429}
+
+
+class ResultOutbox:
+    """
+    Durable delivery of game results to matchmaking. The tick loop only
+    writes the result to Redis (enqueue) and a background sender POSTs it
+    through a pooled aiohttp session. Failed deliveries are retried with
+    exponential backoff up to GAME_RESULT_MAX_ATTEMPTS times, then moved to
+    a dead-letter set. Every attempt carries the same Idempotency-Key, so a
+    retry after a lost response is not applied twice.
+
+    Results are kept as game:<game_id>:result and scheduled in the
+    game:results:outbox sorted set, scored by their next attempt time.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(ResultOutbox, cls).__new__(cls)
+            instance.__init__()
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "initialized"):
+            return
+        self.url = settings.GAME_RESULT_URL
+        self.max_attempts = settings.GAME_RESULT_MAX_ATTEMPTS
+        self.backoff = settings.GAME_RESULT_BACKOFF
+        self.max_backoff = settings.GAME_RESULT_MAX_BACKOFF
+        self.timeout = settings.GAME_RESULT_TIMEOUT
+        self.lease = settings.GAME_RESULT_LEASE
+        self.poll_interval = settings.GAME_RESULT_POLL_INTERVAL
+        self.batch_size = 20
+        # One session and script per event loop, like the Redis clients
+        self.sessions = weakref.WeakKeyDictionary()
+        self.claim_scripts = weakref.WeakKeyDictionary()
+        self.pending = None
+        self.task = None
+        self.enqueued = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.initialized = True
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.pending = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+            logger.debug("Started result outbox sender")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        session = self.sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    async def enqueue(self, game_id, result):
+        """Stores the result and schedules its delivery, in one transaction."""
+        entry = {
+            "game_id": game_id,
+            "result": result,
+            "idempotency_key": uuid.uuid4().hex,
+            "attempts": 0,
+            "enqueued_at": time.time(),
+        }
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.set(result_key(game_id), json.dumps(entry))
+            pipe.zadd(OUTBOX_KEY, {game_id: time.time()})
+            await pipe.execute()
+        self.enqueued += 1
+        logger.debug(f"Queued result of game {game_id} for matchmaking")
+        self.start()
+        self.pending.set()
+
+    def get_session(self):
+        loop = asyncio.get_running_loop()
+        session = self.sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self.sessions[loop] = session
+        return session
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    sent = await self.send_due()
+                except Exception as e:
+                    logger.error(f"Result outbox sweep failed: {e}", exc_info=True)
+                    sent = 0
+                if sent:
+                    continue  # More may be due
+                self.pending.clear()
+                try:
+                    await asyncio.wait_for(self.pending.wait(), await self.next_wait())
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            pass
+        logger.debug("Result outbox sender exited")
+
+    async def next_wait(self):
+        """Seconds until the next scheduled attempt, at most poll_interval."""
+        head = await get_redis().zrange(OUTBOX_KEY, 0, 0, withscores=True)
+        if not head:
+            return self.poll_interval
+        return min(self.poll_interval, max(0.0, head[0][1] - time.time()))
+
+    async def claim(self):
+        loop = asyncio.get_running_loop()
+        claim_script = self.claim_scripts.get(loop)
+        if claim_script is None:
+            redis = get_redis()
+            # Loaded up front: fakeredis drops the connection on the NOSCRIPT
+            # reply redis-py relies on to load it lazily
+            await redis.script_load(CLAIM_SCRIPT)
+            claim_script = redis.register_script(CLAIM_SCRIPT)
+            self.claim_scripts[loop] = claim_script
+        now = time.time()
+        game_ids = await claim_script(
+            keys=[OUTBOX_KEY], args=[now, now + self.lease, self.batch_size]
+        )
+        return [int(game_id) for game_id in game_ids]
+
+    async def send_due(self):
+        """Delivers the results due now, returns how many were attempted."""
+        game_ids = await self.claim()
+        if game_ids:
+            await asyncio.gather(*(self.deliver(game_id) for game_id in game_ids))
+        return len(game_ids)
+
+    async def deliver(self, game_id):
+        redis = get_redis()
+        raw = await redis.get(result_key(game_id))
+        if raw is None:
+            await redis.zrem(OUTBOX_KEY, game_id)
+            return
+        entry = json.loads(raw)
+        entry["attempts"] += 1
+        try:
+            async with self.get_session().post(
+                self.url.format(game_id=game_id),
+                json=entry["result"],
+                headers={"Idempotency-Key": entry["idempotency_key"]},
+            ) as response:
+                body = await response.text()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            await self.retry(entry, f"{type(e).__name__}: {e}")
+            return
+
+        if 200 <= status < 300:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.zrem(OUTBOX_KEY, game_id)
+                pipe.delete(result_key(game_id))
+                await pipe.execute()
+            self.delivered += 1
+            logger.debug(
+                f"Result of game {game_id} delivered after {entry['attempts']} attempts"
+            )
+        elif status >= 500 or status in RETRY_STATUSES:
+            await self.retry(entry, f"HTTP {status}: {body[:200]}")
+        else:
+            await self.dead_letter(entry, f"HTTP {status}: {body[:200]}")
+
+    async def retry(self, entry, error):
+        if entry["attempts"] >= self.max_attempts:
+            await self.dead_letter(entry, error)
+            return
+        # Exponential backoff with jitter, so results failed together spread
+        delay = min(self.max_backoff, self.backoff * 2 ** (entry["attempts"] - 1))
+        delay *= random.uniform(0.5, 1.0)
+        entry["last_error"] = error
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.set(result_key(entry["game_id"]), json.dumps(entry))
+            pipe.zadd(OUTBOX_KEY, {entry["game_id"]: time.time() + delay})
+            await pipe.execute()
+        self.retried += 1
+        logger.warning(
+            f"Result of game {entry['game_id']} not delivered ({error}), "
+            f"attempt {entry['attempts']}, retrying in {delay:.1f} s"
+        )
+
+    async def dead_letter(self, entry, error):
+        """Parks a result matchmaking rejected or never accepted."""
+        entry["last_error"] = error
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.set(result_key(entry["game_id"]), json.dumps(entry))
+            pipe.zrem(OUTBOX_KEY, entry["game_id"])
+            pipe.zadd(DEAD_LETTERS_KEY, {entry["game_id"]: time.time()})
+            await pipe.execute()
+        self.dead += 1
+        logger.error(
+            f"Result of game {entry['game_id']} moved to dead letters after "
+            f"{entry['attempts']} attempts: {error}"
+        )
+
+    async def requeue_dead_letters(self):
+        """
+        Schedules every dead-lettered result again, returns how many. The
+        senders pick them up within GAME_RESULT_POLL_INTERVAL seconds.
+        """
+        redis = get_redis()
+        game_ids = await redis.zrange(DEAD_LETTERS_KEY, 0, -1)
+        for game_id in game_ids:
+            raw = await redis.get(result_key(int(game_id)))
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.zrem(DEAD_LETTERS_KEY, game_id)
+                if raw is not None:
+                    entry = json.loads(raw)
+                    entry["attempts"] = 0
+                    pipe.set(result_key(entry["game_id"]), json.dumps(entry))
+                    pipe.zadd(OUTBOX_KEY, {entry["game_id"]: time.time()})
+                await pipe.execute()
+        return len(game_ids)
+
+    def stats(self):
+        return {
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead": self.dead,
+        }
@@ -3,4 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     path("ws/game/<int:game_id>/", consumers.GameConsumer.as_asgi()),
+    path("ws/game/<int:game_id>/spectate/", consumers.SpectatorConsumer.as_asgi()),
 ]
@@ -0,0 +1,130 @@
+import msgpack
+import logging
+from dataclasses import dataclass, field, fields, replace
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class RuntimeGameState:
+    """
+    In-memory game state used by the tick loop. Holds the same fields as the
+    GameState model (and the same msgpack cache format) without the Django
+    Model machinery, so it is cheap to mutate and copy 40 times a second.
+
+    Every assignment that changes a field's value sets that field's bit in a
+    dirty mask, so the changes since the last frame are known without
+    keeping and comparing a copy of the previous state. A second mask holds
+    the fields changed since the state was last checkpointed.
+    """
+
+    _dirty: int = field(default=0, init=False, repr=False, compare=False)
+    _unsaved: int = field(default=0, init=False, repr=False, compare=False)
+    id: int = None
+    max_score: int = 3
+    is_game_running: bool = False
+    is_game_ended: bool = False
+    player_1_id: int = None
+    player_2_id: int = None
+    player_1_name: str = "Player 1"
+    player_2_name: str = "Player 2"
+    player_1_score: int = 0
+    player_2_score: int = 0
+    player_1_position: float = 17.5
+    player_2_position: float = 17.5
+    ball_x_position: float = 30
+    ball_y_position: float = 20
+    ball_speed: float = 1.2
+    ball_x_direction: float = 0.3
+    ball_y_direction: float = 0.3
+    ball_radius: int = 1
+    game_height: int = 40
+    game_width: int = 60
+    paddle_height: int = 5
+    paddle_width: int = 2
+    paddle_offset: int = 1
+    move_step: float = 0.5
+    sim_rate: int = None
+    snapshot_rate: int = None
+
+    def __setattr__(self, name, value):
+        field_id = FIELD_IDS.get(name)
+        if field_id is not None:
+            try:
+                if getattr(self, name) != value:
+                    bit = 1 << field_id
+                    object.__setattr__(self, "_dirty", self._dirty | bit)
+                    object.__setattr__(self, "_unsaved", self._unsaved | bit)
+            except AttributeError:
+                pass  # First assignment, from __init__
+        object.__setattr__(self, name, value)
+
+    def take_dirty(self):
+        """Returns the dirty mask and clears it."""
+        dirty = self._dirty
+        object.__setattr__(self, "_dirty", 0)
+        return dirty
+
+    def has_changes(self):
+        """Whether fields changed since the last take_dirty()."""
+        return self._dirty != 0
+
+    def take_unsaved(self):
+        """Returns the mask of fields changed since the last checkpoint."""
+        unsaved = self._unsaved
+        object.__setattr__(self, "_unsaved", 0)
+        return unsaved
+
+    def mark_unsaved(self, mask):
+        """Puts back fields whose checkpoint failed."""
+        object.__setattr__(self, "_unsaved", self._unsaved | mask)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in GAME_STATE_FIELDS if name in data})
+
+    @classmethod
+    def from_model(cls, game_state):
+        return cls(**{name: getattr(game_state, name) for name in GAME_STATE_FIELDS})
+
+    @classmethod
+    def from_cache(cls, game_id):
+        packed_data = cache.get(f"{game_id}")
+        if not packed_data:
+            return None
+        try:
+            return cls.from_dict(msgpack.unpackb(packed_data, raw=False))
+        except Exception as e:
+            logger.error(f"Error unpacking game_state_data: {e}")
+            raise
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in GAME_STATE_FIELDS}
+
+    def to_model(self):
+        from .models import GameState
+
+        return GameState(**self.to_dict())
+
+    def copy(self):
+        return replace(self)
+
+    def save(self):
+        if not self.id:
+            logger.warning("Attempting to save game state with no id!")
+        cache.set(f"{self.id}", msgpack.packb(self.to_dict()), timeout=None)
+        logger.debug(f"Saved runtime game state to cache with key {self.id}")
+
+    def delete(self):
+        if settings.USE_REDIS:
+            cache.delete(f"{self.id}")
+            logger.debug(f"Deleted game state from cache with key {self.id}")
+
+
+# Field ids used on the wire are indexes into this tuple: only append to it
+GAME_STATE_FIELDS = tuple(
+    field.name for field in fields(RuntimeGameState) if not field.name.startswith("_")
+)
+FIELD_IDS = {name: field_id for field_id, name in enumerate(GAME_STATE_FIELDS)}
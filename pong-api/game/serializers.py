@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import GameState
 
@@ -32,6 +33,8 @@ class GameStateSerializer(serializers.ModelSerializer):
             "paddle_width",
             "paddle_offset",
             "move_step",
+            "sim_rate",
+            "snapshot_rate",
         )
 
     def validate(self, data):
@@ -43,6 +46,19 @@ class GameStateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 "Both player_1_name and player_2_name are required."
             )
+        sim_rate = data.get("sim_rate")
+        if sim_rate is not None and not 1 <= sim_rate <= settings.GAME_MAX_SIM_RATE:
+            raise serializers.ValidationError(
+                f"sim_rate must be between 1 and {settings.GAME_MAX_SIM_RATE}."
+            )
+        snapshot_rate = data.get("snapshot_rate")
+        if (
+            snapshot_rate is not None
+            and not 1 <= snapshot_rate <= settings.GAME_TICK_RATE
+        ):
+            raise serializers.ValidationError(
+                f"snapshot_rate must be between 1 and {settings.GAME_TICK_RATE}."
+            )
         return data
 
     def create(self, validated_data):
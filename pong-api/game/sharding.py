@@ -0,0 +1,99 @@
+import bisect
+import hashlib
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def worker_key(game_id):
+    return f"game:{game_id}:worker"
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring over the pong-api workers. Each worker owns
+    `replicas` points so games spread evenly, and adding or removing a
+    worker only moves the games of the ring segments it gains or loses.
+    """
+
+    def __init__(self, workers, replicas=100):
+        self.workers = list(workers)
+        points = sorted(
+            (_hash(f"{worker}#{replica}"), worker)
+            for worker in self.workers
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in points]
+        self.owners = [worker for _, worker in points]
+
+    def get(self, game_id):
+        index = bisect.bisect(self.hashes, _hash(str(game_id))) % len(self.hashes)
+        return self.owners[index]
+
+
+_ring = None
+
+
+def get_ring():
+    global _ring
+    if _ring is None or _ring.workers != settings.PONG_API_WORKERS:
+        _ring = HashRing(settings.PONG_API_WORKERS)
+    return _ring
+
+
+def is_sharded():
+    return len(settings.PONG_API_WORKERS) > 1
+
+
+def assign_worker(game_id):
+    """
+    Places a new game on a worker and stores the assignment in Redis. The
+    first assignment wins, so a game never moves once it has been placed.
+    """
+    client = cache.client.get_client()
+    client.set(worker_key(game_id), get_ring().get(game_id), nx=True)
+    worker = client.get(worker_key(game_id)).decode()
+    logger.debug(f"Game {game_id} assigned to worker {worker}")
+    return worker
+
+
+def get_worker(game_id):
+    """Worker hosting the game, for sync callers like the DRF views."""
+    worker = cache.client.get_client().get(worker_key(game_id))
+    return worker.decode() if worker else get_ring().get(game_id)
+
+
+def release_worker(game_id):
+    cache.client.get_client().delete(worker_key(game_id))
+
+
+async def owner(game_id):
+    """Worker hosting the game, from its stored assignment or the ring."""
+    worker = await get_redis().get(worker_key(game_id))
+    return worker.decode() if worker else get_ring().get(game_id)
+
+
+async def is_owned(game_id):
+    """Whether this worker hosts the game."""
+    if not is_sharded():
+        return True
+    return await owner(game_id) == settings.PONG_API_WORKER
+
+
+async def expire(game_id, timeout):
+    await get_redis().expire(worker_key(game_id), timeout, nx=True)
+
+
+async def persist(game_id):
+    await get_redis().persist(worker_key(game_id))
+
+
+async def release(game_id):
+    await get_redis().delete(worker_key(game_id))
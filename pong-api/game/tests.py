@@ -1,6 +1,40 @@
+import asyncio
+import random
+import numpy as np
+from contextlib import asynccontextmanager
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from rest_framework.test import APITestCase
 from rest_framework import status
 from game.models import GameState
+from game.engine.batch_engine import BatchPongEngine
+from game.engine import tracing
+from game.engine.pong_game_engine import PongGameEngine
+from game.game_state_manager import GameStateManager
+from game import protocol
+from game.channel_layers import HybridChannelLayer
+from game.checkpointer import Checkpointer
+from game.delta_encoder import DeltaEncoder
+from game.lifecycle import GameReaper
+from game.rate_limit import InputGuard, TokenBucket
+from game import metrics
+from game.metrics import TickMetrics
+from game.presence import GamePresence, presence_key
+from game.redis_client import get_redis
+from game.repository import GameStateRepository
+from game import result_outbox
+from game.result_outbox import ResultOutbox
+from game.routing import websocket_urlpatterns
+from game.runtime_state import RuntimeGameState, FIELD_IDS
+from game import sharding
+from game.tick_scheduler import ScheduledGame, TickScheduler
 
 
 class GameAPITest(APITestCase):
@@ -53,3 +87,1032 @@ class GameAPITest(APITestCase):
         response = self.client.delete(delete_url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
+
+class TickSchedulerTest(SimpleTestCase):
+    game_id = 9001
+
+    def setUp(self):
+        GameState(
+            id=self.game_id,
+            player_1_id=1,
+            player_2_id=2,
+            is_game_running=True,
+        ).save()
+        self.manager = GameStateManager(self.game_id)
+        self.channel_layer = InMemoryChannelLayer()
+        TickScheduler._instance = None
+
+    def tearDown(self):
+        GameStateManager._instances.pop(self.game_id, None)
+        TickScheduler._instance = None
+        TickMetrics._instance = None
+        cache.delete(f"{self.game_id}")
+
+    async def test_ticks_games_and_broadcasts_diffs(self):
+        group = f"game_{self.game_id}"
+        channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(group, channel)
+        start_x = self.manager.game_state.ball_x_position
+
+        await self.manager.start_periodic_updates(self.channel_layer, group)
+        message = await asyncio.wait_for(self.channel_layer.receive(channel), 1)
+        await self.manager.stop_periodic_updates()
+
+        self.assertEqual(message["type"], "game_state_update")
+        self.assertNotEqual(self.manager.game_state.ball_x_position, start_x)
+
+    async def test_moves_are_coalesced_once_per_tick(self):
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, f"game_{self.game_id}")
+        scheduler.task.cancel()
+        game_state = self.manager.game_state
+        start_1 = game_state.player_1_position
+        start_2 = game_state.player_2_position
+        for _ in range(10):
+            self.manager.queue_move(1, 1)
+        self.manager.queue_move(2, 1)
+        self.manager.queue_move(2, -1)
+        await scheduler._tick(3)
+        step = self.manager.engine.geometry.move_step
+        max_steps = self.manager.inputs.max_steps
+        self.assertAlmostEqual(game_state.player_1_position, start_1 + max_steps * step)
+        self.assertEqual(game_state.player_2_position, start_2)
+        self.assertEqual(self.manager.inputs.pending, {})
+
+        # Below the cap a paddle moves as far as it was asked to
+        self.manager.queue_move(1, -1)
+        await scheduler._tick(1)
+        self.assertAlmostEqual(
+            game_state.player_1_position, start_1 + (max_steps - 1) * step
+        )
+
+    @override_settings(GAME_PHYSICS_BACKEND="batch")
+    async def test_batch_backend_picks_up_moves_and_toggles(self):
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, f"game_{self.game_id}")
+        scheduler.task.cancel()
+        game_state = self.manager.game_state
+        start = game_state.player_1_position
+        self.manager.queue_move(1, 1)
+        await scheduler._tick(1)
+        moved = game_state.player_1_position
+        self.assertGreater(moved, start)
+        slot = scheduler.batch_engine.slots[self.game_id]
+        self.assertEqual(
+            scheduler.batch_engine.arrays["player_1_position"][slot], moved
+        )
+
+        await self.manager.toggle_game()
+        ball_x = game_state.ball_x_position
+        await scheduler._tick(1)
+        self.assertEqual(game_state.ball_x_position, ball_x)
+        self.assertEqual(game_state.player_1_position, moved)
+
+    async def test_sampled_ticks_are_timed_and_exposed(self):
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, f"game_{self.game_id}")
+        scheduler.task.cancel()
+        for tick in range(scheduler.metrics.sample_interval + 1):
+            scheduler.ticks = tick
+            await scheduler._tick(1)
+        metrics = TickMetrics()
+        self.assertEqual(metrics.phases["update"].count, 2)
+        self.assertEqual(metrics.frames[self.game_id], scheduler.ticks + 1)
+
+        response = await self.async_client.get("/game/metrics/")
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('pong_tick_phase_seconds_count{phase="update"} 2', body)
+        self.assertIn(f'pong_game_frames_total{{game_id="{self.game_id}"}}', body)
+        self.assertIn("pong_scheduled_games 1", body)
+
+    async def test_paused_games_are_parked_until_woken(self):
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, f"game_{self.game_id}")
+        self.addCleanup(scheduler.unregister, self.manager)
+        game_state = self.manager.game_state
+        await self.manager.toggle_game()
+        await asyncio.sleep(0.1)  # The pause frame is sent, then the game parks
+        self.assertTrue(scheduler.is_parked(self.game_id))
+        ticks = scheduler.ticks
+        await asyncio.sleep(0.1)
+        self.assertEqual(scheduler.ticks, ticks)
+
+        # A move wakes the game for one tick, where it is dropped
+        position = game_state.player_1_position
+        self.manager.queue_move(1, 1)
+        await asyncio.sleep(0.1)
+        self.assertEqual(game_state.player_1_position, position)
+        self.assertTrue(scheduler.is_parked(self.game_id))
+
+        ball_x = game_state.ball_x_position
+        await self.manager.toggle_game()
+        await asyncio.sleep(0.1)
+        self.assertFalse(scheduler.is_parked(self.game_id))
+        self.assertGreater(scheduler.ticks, ticks + 1)
+        self.assertNotEqual(game_state.ball_x_position, ball_x)
+
+    @override_settings(GAME_TICK_RATE=40)
+    def test_sim_and_snapshot_rates_are_decoupled(self):
+        game_state = self.manager.game_state
+        game_state.sim_rate, game_state.snapshot_rate = 120, 20
+        game = ScheduledGame(self.manager, self.channel_layer, "group")
+        self.assertEqual([game.take_substeps(1) for _ in range(4)], [3, 3, 3, 3])
+        self.assertEqual(game.take_substeps(2), 6)  # Catching up a late tick
+        self.assertEqual(
+            [game.take_send() for _ in range(4)], [False, True, False, True]
+        )
+
+        # Three 120 Hz substeps cover the distance of one 40 Hz step
+        fine = RuntimeGameState(is_game_running=True, sim_rate=120)
+        coarse = RuntimeGameState(is_game_running=True, sim_rate=40)
+        fine_engine = PongGameEngine(fine)
+        for _ in range(3):
+            fine_engine.step()
+        PongGameEngine(coarse).step()
+        self.assertAlmostEqual(fine.ball_x_position, coarse.ball_x_position)
+        self.assertAlmostEqual(fine.ball_y_position, coarse.ball_y_position)
+
+    async def test_spectators_get_rate_reduced_keyframes(self):
+        group = f"game_{self.game_id}"
+        channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(f"{group}_spectators", channel)
+        self.manager.spectators = 1
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, group)
+        scheduler.task.cancel()
+        for _ in range(scheduler.spectator_interval * 2):
+            await scheduler._tick(1)
+            scheduler.ticks += 1
+        scheduler.unregister(self.manager)
+
+        for _ in range(2):
+            await asyncio.wait_for(self.channel_layer.receive(channel), 1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.channel_layer.receive(channel), 0.05)
+
+    async def test_stop_unregisters_and_stops_loop(self):
+        scheduler = TickScheduler()
+        await self.manager.start_periodic_updates(self.channel_layer, "group")
+        self.assertTrue(scheduler.is_registered(self.manager))
+        await self.manager.stop_periodic_updates()
+        self.assertFalse(scheduler.is_registered(self.manager))
+        self.assertIsNone(scheduler.task)
+
+    async def test_ended_game_queues_its_result_in_a_task(self):
+        self.manager.game_state.is_game_ended = True
+        await self.manager.end_game(self.channel_layer, "group")
+        self.assertTrue(self.manager.match_result_sent)
+        await self.manager.result_task
+        redis = get_redis()
+        key = result_outbox.result_key(self.game_id)
+        self.assertIsNotNone(await redis.get(key))
+        await redis.delete(key)
+        await redis.zrem(result_outbox.OUTBOX_KEY, self.game_id)
+        await ResultOutbox().stop()
+        ResultOutbox._instance = None
+
+    async def test_ended_games_park_once_their_result_is_queued(self):
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, f"game_{self.game_id}")
+        scheduler.task.cancel()
+        game_state = self.manager.game_state
+        game_state.is_game_ended, game_state.is_game_running = True, False
+        await scheduler._tick(1)
+        await self.manager.result_task
+        self.assertTrue(scheduler.is_parked(self.game_id))
+        redis = get_redis()
+        await redis.delete(result_outbox.result_key(self.game_id))
+        await redis.zrem(result_outbox.OUTBOX_KEY, self.game_id)
+        await ResultOutbox().stop()
+        ResultOutbox._instance = None
+
+    async def test_ended_game_is_closed_once_after_its_final_frame(self):
+        group = f"game_{self.game_id}"
+        channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(group, channel)
+        game_state = self.manager.game_state
+        game_state.sim_rate = 3 * settings.GAME_TICK_RATE
+        scheduler = TickScheduler()
+        scheduler.register(self.manager, self.channel_layer, group)
+        scheduler.task.cancel()
+        game_state.is_game_ended, game_state.is_game_running = True, False
+        await scheduler._tick(1)
+        await scheduler._tick(1)
+        await self.manager.result_task
+
+        received = []
+        with self.assertRaises(asyncio.TimeoutError):
+            while True:
+                message = await asyncio.wait_for(
+                    self.channel_layer.receive(channel), 0.05
+                )
+                received.append(message["type"])
+        self.assertEqual(received, ["game_state_update", "connection_closed"])
+        redis = get_redis()
+        await redis.delete(result_outbox.result_key(self.game_id))
+        await redis.zrem(result_outbox.OUTBOX_KEY, self.game_id)
+        await ResultOutbox().stop()
+        ResultOutbox._instance = None
+
+    async def test_failing_tick_does_not_stop_the_loop(self):
+        scheduler = TickScheduler()
+        tick = scheduler._tick
+        failures = []
+
+        async def failing_tick(steps):
+            if not failures:
+                failures.append(steps)
+                raise RuntimeError("boom")
+            await tick(steps)
+
+        scheduler._tick = failing_tick
+        scheduler.register(self.manager, self.channel_layer, "group")
+        self.addCleanup(scheduler.unregister, self.manager)
+        with self.assertLogs("game.tick_scheduler", "ERROR"):
+            await asyncio.sleep(0.1)
+        self.assertEqual(len(failures), 1)
+        self.assertFalse(scheduler.task.done())
+        self.assertGreater(scheduler.ticks, 1)
+
+
+class BatchPongEngineTest(SimpleTestCase):
+    compared_fields = (
+        "ball_x_position",
+        "ball_y_position",
+        "ball_x_direction",
+        "ball_y_direction",
+        "player_1_position",
+        "player_2_position",
+        "player_1_score",
+        "player_2_score",
+        "is_game_running",
+        "is_game_ended",
+    )
+
+    def make_state(self, rng, game_id):
+        return RuntimeGameState(
+            id=game_id,
+            player_1_id=1,
+            player_2_id=1 if game_id % 5 == 0 else 2,
+            is_game_running=True,
+            max_score=rng.randint(1, 3),
+            ball_x_position=rng.uniform(1, 59),
+            ball_y_position=rng.uniform(1, 39),
+            ball_x_direction=rng.choice([-1, 1]) * rng.uniform(0.2, 1.2),
+            ball_y_direction=rng.choice([-1, 1]) * rng.uniform(0, 0.7),
+            player_1_position=rng.uniform(0, 35),
+            player_2_position=rng.uniform(0, 35),
+            sim_rate=rng.choice([None, 120]),
+        )
+
+    def test_matches_scalar_engine(self):
+        rng = random.Random(42)
+        scalar_states = [self.make_state(rng, game_id) for game_id in range(1, 41)]
+        batch_states = [state.copy() for state in scalar_states]
+        engine = BatchPongEngine(capacity=8)
+        for state in batch_states:
+            engine.add(state.id, state)
+
+        for _ in range(400):
+            for state in scalar_states:
+                PongGameEngine(state).update_game_state()
+                # Restart paused games so every game keeps being exercised
+                if not state.is_game_ended:
+                    state.is_game_running = True
+            engine.step()
+            for state in batch_states:
+                engine.store(state.id, state)
+                if not state.is_game_ended:
+                    state.is_game_running = True
+                engine.load(state.id, state)
+
+            for scalar, batch in zip(scalar_states, batch_states):
+                for field in self.compared_fields:
+                    self.assertEqual(
+                        getattr(scalar, field), getattr(batch, field), field
+                    )
+        self.assertTrue(any(state.is_game_ended for state in scalar_states))
+
+    def test_remove_keeps_other_slots(self):
+        rng = random.Random(7)
+        states = [self.make_state(rng, game_id) for game_id in range(1, 4)]
+        engine = BatchPongEngine()
+        for state in states:
+            engine.add(state.id, state)
+        engine.remove(1)
+        engine.step()
+        self.assertNotIn(1, engine)
+        self.assertEqual(len(engine), 2)
+        moved = states[2].copy()
+        engine.store(3, moved)
+        PongGameEngine(states[2]).update_game_state()
+        self.assertEqual(moved.ball_x_position, states[2].ball_x_position)
+
+    def test_step_many_writes_back_only_changed_values(self):
+        rng = random.Random(3)
+        running, paused = (self.make_state(rng, game_id) for game_id in (1, 2))
+        paused.is_game_running = False
+        engine = BatchPongEngine()
+        for state in (running, paused):
+            engine.add(state.id, state)
+            state.take_dirty()
+        expected = running.copy()
+        PongGameEngine(expected).update_game_state()
+
+        engine.step_many(np.array([1, 1]))
+        for field in self.compared_fields:
+            self.assertEqual(getattr(running, field), getattr(expected, field), field)
+        self.assertTrue(running.has_changes())
+        self.assertFalse(paused.has_changes())
+
+
+class RuntimeGameStateTest(SimpleTestCase):
+    game_id = 9002
+
+    def tearDown(self):
+        cache.delete(f"{self.game_id}")
+
+    def test_reads_and_writes_model_cache_format(self):
+        GameState(id=self.game_id, player_1_id=1, player_2_id=2, max_score=5).save()
+        state = RuntimeGameState.from_cache(self.game_id)
+        self.assertEqual(state.max_score, 5)
+        self.assertFalse(hasattr(state, "__dict__"))
+
+        state.player_1_score = 2
+        state.save()
+        model = GameState.from_cache(self.game_id)
+        self.assertEqual(model.player_1_score, 2)
+        self.assertEqual(RuntimeGameState.from_model(model), state)
+        self.assertEqual(state.to_model().player_1_score, 2)
+
+    def test_copy_is_independent(self):
+        state = RuntimeGameState(id=self.game_id)
+        previous = state.copy()
+        state.ball_x_position += 1
+        self.assertNotEqual(state, previous)
+        self.assertIsNone(RuntimeGameState.from_cache(-1))
+
+
+class PongGameEngineTest(SimpleTestCase):
+    def test_persistent_engine_matches_engine_per_tick(self):
+        fresh = RuntimeGameState(
+            id=1, player_1_id=1, player_2_id=2, is_game_running=True
+        )
+        bound = fresh.copy()
+        engine = PongGameEngine(bound)
+        for _ in range(300):
+            fresh = PongGameEngine(fresh).update_game_state()
+            engine.step()
+            fresh.is_game_running = bound.is_game_running = not bound.is_game_ended
+        self.assertEqual(fresh, bound)
+
+    def test_move_player_clamped_by_geometry(self):
+        game_state = RuntimeGameState(
+            player_1_id=1, player_2_id=2, is_game_running=True
+        )
+        engine = PongGameEngine(game_state)
+        for _ in range(200):
+            engine.move_player(1, 1)
+        self.assertEqual(
+            game_state.player_1_position, engine.geometry.max_paddle_position
+        )
+
+    def test_tracing_is_enabled_per_game_at_runtime(self):
+        game_state = RuntimeGameState(
+            id=9009, player_1_id=1, player_2_id=2, is_game_running=True
+        )
+        engine = PongGameEngine(game_state)
+        engine.step()
+        self.assertIsNone(engine.trace)
+        tracing.enable(game_state.id)
+        self.addCleanup(tracing.disable, game_state.id)
+        with self.assertLogs(tracing.__name__, "INFO") as logs:
+            engine.step()
+            engine.move_player(1, 1)
+        events = [record.trace_event for record in logs.records]
+        self.assertEqual(events, ["ball_moved", "player_moved"])
+        self.assertEqual(logs.records[1].trace_fields["direction"], 1)
+
+    def test_swept_collisions_stop_tunneling_at_low_sim_rate(self):
+        # At 4 steps per second the ball covers 12 units per step and jumps
+        # over player_2's paddle between two discrete positions
+        def play(mode):
+            game_state = RuntimeGameState(
+                player_1_id=1,
+                player_2_id=2,
+                is_game_running=True,
+                sim_rate=4,
+                ball_x_position=20,
+                ball_x_direction=-1.2,
+                ball_y_direction=0,
+            )
+            with override_settings(GAME_COLLISION_MODE=mode):
+                engine = PongGameEngine(game_state)
+            engine.step()
+            engine.step()
+            return game_state
+
+        discrete = play("discrete")
+        self.assertEqual(discrete.player_1_score, 1)
+
+        swept = play("swept")
+        self.assertEqual(swept.player_1_score, 0)
+        self.assertGreater(swept.ball_x_direction, 0)
+        # Hits the paddle face halfway through the step, then travels back
+        self.assertAlmostEqual(swept.ball_x_position, 8)
+
+    @override_settings(GAME_COLLISION_MODE="swept")
+    def test_swept_wall_bounce_reflects_at_time_of_impact(self):
+        game_state = RuntimeGameState(
+            player_1_id=1,
+            player_2_id=2,
+            is_game_running=True,
+            sim_rate=4,
+            ball_y_position=35,
+            ball_x_direction=0,
+            ball_y_direction=0.6,
+        )
+        PongGameEngine(game_state).step()
+        self.assertAlmostEqual(game_state.ball_y_position, 37)
+        self.assertEqual(game_state.ball_y_direction, -0.6)
+
+
+class DeltaEncoderTest(SimpleTestCase):
+    def test_diff_contains_only_fields_written_since_last_frame(self):
+        game_state = RuntimeGameState(id=1)
+        encoder = DeltaEncoder(keyframe_interval=100)
+        self.assertIsNone(encoder.encode(game_state))
+
+        game_state.ball_x_position += 1
+        game_state.player_1_score = game_state.player_1_score  # Unchanged
+        frame = encoder.encode(game_state)
+        self.assertEqual(
+            frame["diff"], {FIELD_IDS["ball_x_position"]: game_state.ball_x_position}
+        )
+        self.assertIsNone(encoder.encode(game_state))
+
+    def test_sends_keyframes_periodically(self):
+        game_state = RuntimeGameState(id=1, max_score=7)
+        encoder = DeltaEncoder(keyframe_interval=3)
+        frames = [encoder.encode(game_state) for _ in range(3)]
+        self.assertEqual(frames[:2], [None, None])
+        keyframe = frames[2]
+        self.assertTrue(keyframe["keyframe"])
+        self.assertEqual(
+            dict(zip(keyframe["fields"], keyframe["state"]))["max_score"], 7
+        )
+        self.assertEqual(keyframe["seq"], 1)
+
+    def test_trajectory_mode_sends_ball_only_when_its_path_changes(self):
+        def play(encoder):
+            game_state = RuntimeGameState(
+                id=1, player_1_id=1, player_2_id=2, is_game_running=True
+            )
+            engine = PongGameEngine(game_state)
+            frames = []
+            for _ in range(400):
+                engine.step()
+                game_state.is_game_running = not game_state.is_game_ended
+                frames.append(encoder.encode(game_state))
+            return engine, frames
+
+        _, position_frames = play(DeltaEncoder(keyframe_interval=10**6))
+        engine, trajectory_frames = play(
+            DeltaEncoder(keyframe_interval=10**6, trajectory=True)
+        )
+
+        sent = [(step, frame) for step, frame in enumerate(trajectory_frames) if frame]
+        self.assertTrue(all(position_frames))
+        self.assertLess(len(sent) * 10, len(position_frames))
+        # Every frame still sent starts a new path, from the current position
+        for _, frame in sent:
+            x, y, vx, vy, _ = frame["ball"]
+            self.assertEqual(frame["diff"][FIELD_IDS["ball_x_position"]], x)
+            self.assertEqual(frame["diff"][FIELD_IDS["ball_y_position"]], y)
+
+        # Since the last frame the ball followed the sent trajectory
+        step, frame = sent[-1]
+        x, y, vx, vy, _ = frame["ball"]
+        elapsed = (len(trajectory_frames) - 1 - step) / settings.GAME_TICK_RATE
+        self.assertAlmostEqual(engine.game_state.ball_x_position, x + vx * elapsed)
+        self.assertAlmostEqual(engine.game_state.ball_y_position, y + vy * elapsed)
+
+
+@override_settings(
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+)
+class GameProtocolTest(SimpleTestCase):
+    game_id = 9003
+
+    def setUp(self):
+        RuntimeGameState(id=self.game_id, player_1_id=1, player_2_id=2).save()
+        self.application = URLRouter(websocket_urlpatterns)
+
+    def tearDown(self):
+        GameStateManager._instances.pop(self.game_id, None)
+        TickScheduler._instance = None
+        cache.delete(f"{self.game_id}")
+        GamePresence._instance = None
+        cache.client.get_client().delete(presence_key(self.game_id))
+
+    def test_binary_frame_round_trip(self):
+        diff = {"seq": 4, "diff": {"12": 1.5}}
+        self.assertEqual(
+            protocol.decode_binary_frame(protocol.encode_binary_frame(diff)),
+            {"seq": 4, "diff": {12: 1.5}},
+        )
+        keyframe = DeltaEncoder(100).keyframe(RuntimeGameState(id=1))
+        decoded = protocol.decode_binary_frame(protocol.encode_binary_frame(keyframe))
+        self.assertEqual(decoded["fields"], list(keyframe["fields"]))
+        self.assertEqual(decoded["state"], keyframe["state"])
+        trajectory = {"seq": 5, "diff": {}, "ball": [1.0, 2.0, 12.0, -6.0, 1000]}
+        self.assertEqual(
+            protocol.decode_binary_frame(protocol.encode_binary_frame(trajectory)),
+            trajectory,
+        )
+
+    async def test_negotiates_binary_subprotocol(self):
+        communicator = WebsocketCommunicator(
+            self.application,
+            f"/ws/game/{self.game_id}/",
+            subprotocols=[protocol.BINARY_SUBPROTOCOL],
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, protocol.BINARY_SUBPROTOCOL)
+        output = await communicator.receive_output(1)
+        frame = protocol.decode_binary_frame(output["bytes"])
+        self.assertTrue(frame["keyframe"])
+        await communicator.disconnect()
+
+    async def test_text_protocol_is_default(self):
+        communicator = WebsocketCommunicator(
+            self.application, f"/ws/game/{self.game_id}/"
+        )
+        connected, subprotocol = await communicator.connect()
+        self.assertIsNone(subprotocol)
+        message = await communicator.receive_json_from(1)
+        self.assertEqual(message["type"], "game_state_update")
+        await communicator.disconnect()
+
+    async def test_oversized_and_malformed_messages(self):
+        communicator = WebsocketCommunicator(
+            self.application, f"/ws/game/{self.game_id}/"
+        )
+        await communicator.connect()
+        await communicator.receive_output(1)  # Join snapshot
+        await communicator.send_to(text_data="not json")
+        await communicator.send_to(text_data="x" * 4096)
+        output = await communicator.receive_output(1)
+        self.assertEqual(output, {"type": "websocket.close", "code": 1009})
+        self.assertGreaterEqual(InputGuard.stats()["malformed"], 1)
+        await communicator.disconnect()
+
+    async def test_malformed_moves_are_dropped(self):
+        communicator = WebsocketCommunicator(
+            self.application, f"/ws/game/{self.game_id}/"
+        )
+        await communicator.connect()
+        await communicator.receive_output(1)  # Join snapshot
+        malformed = InputGuard.stats()["malformed"]
+        await communicator.send_json_to({"action": "move"})
+        await communicator.send_json_to(
+            {"action": "move", "player_id": [1], "direction": 1}
+        )
+        # The consumer survived and still answers
+        await communicator.send_json_to({"action": "resync"})
+        message = await communicator.receive_json_from(1)
+        self.assertEqual(message["type"], "game_state_update")
+        self.assertEqual(InputGuard.stats()["malformed"], malformed + 2)
+        await communicator.disconnect()
+
+    async def test_group_frames_forwarded_without_reencoding(self):
+        binary = WebsocketCommunicator(
+            self.application,
+            f"/ws/game/{self.game_id}/",
+            subprotocols=[protocol.BINARY_SUBPROTOCOL],
+        )
+        text = WebsocketCommunicator(self.application, f"/ws/game/{self.game_id}/")
+        await binary.connect()
+        await text.connect()
+        for communicator in (binary, text):
+            await communicator.receive_output(1)  # Join snapshots
+
+        event = protocol.build_frame_event({"seq": 9, "diff": {"12": 2.5}})
+        await get_channel_layer().group_send(f"game_{self.game_id}", event)
+        self.assertEqual((await binary.receive_output(1))["bytes"], event["bytes"])
+        self.assertEqual((await text.receive_output(1))["text"], event["text"])
+        await binary.disconnect()
+        await text.disconnect()
+
+    async def test_join_and_resync_snapshots_are_unicast(self):
+        first = WebsocketCommunicator(self.application, f"/ws/game/{self.game_id}/")
+        await first.connect()
+        snapshot = await first.receive_json_from(1)
+        self.assertEqual(snapshot["type"], "game_state_update")
+
+        second = WebsocketCommunicator(
+            self.application,
+            f"/ws/game/{self.game_id}/",
+            subprotocols=[protocol.BINARY_SUBPROTOCOL],
+        )
+        await second.connect()
+        await second.receive_output(1)
+        self.assertTrue(await first.receive_nothing(0.1))
+
+        await second.send_json_to({"action": "resync"})
+        frame = protocol.decode_binary_frame((await second.receive_output(1))["bytes"])
+        self.assertTrue(frame["keyframe"])
+        self.assertEqual(frame["seq"], GameStateManager(self.game_id).encoder.seq)
+        self.assertTrue(await first.receive_nothing(0.1))
+        await first.disconnect()
+        await second.disconnect()
+
+    async def test_spectator_input_is_screened(self):
+        spectator = WebsocketCommunicator(
+            self.application, f"/ws/game/{self.game_id}/spectate/"
+        )
+        await spectator.connect()
+        await spectator.receive_output(1)  # Join snapshot
+        await spectator.send_to(text_data="x" * 4096)
+        output = await spectator.receive_output(1)
+        self.assertEqual(output, {"type": "websocket.close", "code": 1009})
+        await spectator.disconnect()
+
+    async def test_spectator_gets_snapshot_without_disturbing_players(self):
+        player = WebsocketCommunicator(self.application, f"/ws/game/{self.game_id}/")
+        await player.connect()
+        await player.receive_output(1)
+        spectator = WebsocketCommunicator(
+            self.application,
+            f"/ws/game/{self.game_id}/spectate/",
+            subprotocols=[protocol.BINARY_SUBPROTOCOL],
+        )
+        connected, _ = await spectator.connect()
+        self.assertTrue(connected)
+        frame = protocol.decode_binary_frame(
+            (await spectator.receive_output(1))["bytes"]
+        )
+        self.assertTrue(frame["keyframe"])
+        self.assertIn("time", frame)
+        self.assertTrue(await player.receive_nothing(0.1))
+        self.assertEqual(GamePresence().local_count(self.game_id), 1)
+        self.assertEqual(GameStateManager(self.game_id).spectators, 1)
+        await spectator.disconnect()
+        self.assertEqual(GameStateManager(self.game_id).spectators, 0)
+        await player.disconnect()
+
+    def test_snapshot_keeps_diff_stream_sequence(self):
+        game_state = RuntimeGameState(id=1)
+        encoder = DeltaEncoder(keyframe_interval=100)
+        game_state.ball_x_position += 1
+        first = encoder.encode(game_state)
+        snapshot = encoder.snapshot(game_state)
+        self.assertEqual(snapshot["seq"], first["seq"])
+        game_state.ball_x_position += 1
+        self.assertEqual(encoder.encode(game_state)["seq"], first["seq"] + 1)
+
+
+class GameStateRepositoryTest(SimpleTestCase):
+    game_id = 9006
+
+    def tearDown(self):
+        GameStateManager._instances.pop(self.game_id, None)
+        cache.delete(f"{self.game_id}")
+
+    async def test_compatible_with_sync_cache_api(self):
+        repository = GameStateRepository()
+        await repository.save(RuntimeGameState(id=self.game_id, player_1_score=2))
+        self.assertEqual(RuntimeGameState.from_cache(self.game_id).player_1_score, 2)
+
+        RuntimeGameState(id=self.game_id, player_2_score=1).save()
+        game_state = await repository.load(self.game_id)
+        self.assertEqual(game_state.player_2_score, 1)
+
+        await repository.delete(self.game_id)
+        self.assertIsNone(await repository.load(self.game_id))
+
+    async def test_manager_load(self):
+        with self.assertRaises(GameState.DoesNotExist):
+            await GameStateManager.load(self.game_id)
+        await GameStateRepository().save_many([RuntimeGameState(id=self.game_id)])
+        manager = await GameStateManager.load(self.game_id)
+        self.assertIs(await GameStateManager.load(self.game_id), manager)
+        self.assertEqual(manager.game_state.id, self.game_id)
+
+
+class CheckpointerTest(SimpleTestCase):
+    game_ids = (9007, 9008)
+
+    def tearDown(self):
+        Checkpointer._instance = None
+        for game_id in self.game_ids:
+            GameStateManager._instances.pop(game_id, None)
+            cache.delete(f"{game_id}")
+
+    async def test_checkpoints_only_changed_games(self):
+        managers = [
+            GameStateManager(game_id, RuntimeGameState(id=game_id))
+            for game_id in self.game_ids
+        ]
+        managers[0].game_state.player_1_score = 2
+        checkpointer = Checkpointer()
+        self.assertEqual(await checkpointer.checkpoint(managers), 1)
+        self.assertEqual(checkpointer.stats()["last_games"], 1)
+        self.assertGreater(checkpointer.stats()["last_size"], 0)
+        size = checkpointer.stats()["last_size"]
+        self.assertIn(f"pong_checkpoint_last_bytes {size}", metrics.render())
+        saved = await GameStateRepository().load(self.game_ids[0])
+        self.assertEqual(saved.player_1_score, 2)
+        self.assertIsNone(await GameStateRepository().load(self.game_ids[1]))
+        self.assertEqual(await checkpointer.checkpoint(managers), 0)
+
+    async def test_recover_rehydrates_paused_managers(self):
+        game_id, unplayed_id = self.game_ids
+        running = RuntimeGameState(id=game_id, is_game_running=True)
+        await GameStateRepository().save_many([running])
+        # Created but never checkpointed
+        await GameStateRepository().save(RuntimeGameState(id=unplayed_id))
+        self.assertEqual(await Checkpointer().recover(), [game_id])
+        manager = GameStateManager._instances[game_id]
+        self.assertFalse(manager.game_state.is_game_running)
+        saved = await GameStateRepository().load(game_id)
+        self.assertFalse(saved.is_game_running)
+
+
+class InputGuardTest(SimpleTestCase):
+    def test_token_bucket_refills_at_rate(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=10, burst=2, clock=lambda: now[0])
+        self.assertEqual([bucket.allow() for _ in range(3)], [True, True, False])
+        now[0] = 0.1
+        self.assertTrue(bucket.allow())
+        self.assertFalse(bucket.allow())
+
+    @override_settings(GAME_INPUT_BURST=2, GAME_INPUT_RATE=0, GAME_INPUT_MAX_DROPS=2)
+    def test_flooding_client_is_dropped_then_closed(self):
+        guard = InputGuard()
+        message = '{"action": "move", "player_id": 1, "direction": 1}'
+        verdicts = [guard.check(message)[0] for _ in range(4)]
+        self.assertEqual(verdicts, ["accept", "accept", "drop", "close"])
+
+    def test_empty_frame_is_malformed_not_oversized(self):
+        malformed = InputGuard.stats()["malformed"]
+        self.assertEqual(InputGuard().check(), ("drop", None))
+        self.assertEqual(InputGuard.stats()["malformed"], malformed + 1)
+
+
+class GameReaperTest(SimpleTestCase):
+    game_ids = (9011, 9012, 9013)
+
+    def tearDown(self):
+        GameReaper._instance = None
+        Checkpointer._instance = None
+        for game_id in self.game_ids:
+            GameStateManager._instances.pop(game_id, None)
+            cache.delete(f"{game_id}")
+
+    async def make_manager(self, game_id, **fields):
+        game_state = RuntimeGameState(id=game_id, **fields)
+        await GameStateRepository().save(game_state)
+        return GameStateManager(game_id, game_state)
+
+    async def test_evicts_ended_and_idle_games(self):
+        ended = await self.make_manager(self.game_ids[0], is_game_ended=True)
+        ended.match_result_sent = True
+        idle = await self.make_manager(self.game_ids[1], player_1_score=1)
+        idle.last_activity -= GameReaper().idle_timeout
+        active = await self.make_manager(self.game_ids[2])
+        reaper = GameReaper()
+        await reaper.sweep()
+        self.assertNotIn(ended.game_id, GameStateManager._instances)
+        self.assertNotIn(idle.game_id, GameStateManager._instances)
+        self.assertIs(GameStateManager._instances[active.game_id], active)
+        self.assertEqual(reaper.stats()["evicted"]["ended"], 1)
+        self.assertEqual(reaper.stats()["evicted"]["idle"], 1)
+        # The ended state was deleted, the idle one is left to expire
+        repository = GameStateRepository()
+        self.assertIsNone(await repository.load(ended.game_id))
+        self.assertGreater(await get_redis().ttl(repository.key(idle.game_id)), 0)
+        self.assertEqual(await get_redis().ttl(repository.key(active.game_id)), -1)
+
+    async def test_evicts_least_recently_active_games_over_capacity(self):
+        managers = [await self.make_manager(game_id) for game_id in self.game_ids]
+        managers[1].last_activity -= 10
+        reaper = GameReaper()
+        reaper.max_live_games = len(GameStateManager._instances) - 1
+        await reaper.sweep()
+        self.assertNotIn(managers[1].game_id, GameStateManager._instances)
+        self.assertEqual(reaper.stats()["evicted"]["capacity"], 1)
+
+    async def test_load_revives_an_evicted_game(self):
+        manager = await self.make_manager(self.game_ids[0])
+        manager.last_activity -= GameReaper().idle_timeout
+        await GameReaper().sweep()
+        revived = await GameStateManager.load(manager.game_id)
+        self.assertIsNot(revived, manager)
+        key = GameStateRepository().key(manager.game_id)
+        self.assertEqual(await get_redis().ttl(key), -1)
+        GameReaper().task.cancel()
+
+    async def test_evicted_games_leave_the_tick_loop_before_teardown(self):
+        manager = await self.make_manager(self.game_ids[0])
+        manager.last_activity -= GameReaper().idle_timeout
+        scheduler = TickScheduler()
+        scheduler.register(manager, InMemoryChannelLayer(), "group")
+        self.addCleanup(setattr, TickScheduler, "_instance", None)
+        scheduler.task.cancel()
+        reaper = GameReaper()
+        evictions = []
+
+        async def evict(manager, reason):
+            evictions.append(scheduler.is_registered(manager))
+
+        reaper.evict = evict
+        await reaper.sweep()
+        self.assertEqual(evictions, [False])
+        self.assertNotIn(manager.game_id, scheduler.games)
+
+    async def test_unclaimed_games_expire_after_the_idle_timeout(self):
+        repository = GameStateRepository()
+        await repository.save(RuntimeGameState(id=self.game_ids[0]))
+        reaper = GameReaper()
+        await reaper.reconcile()
+        key = repository.key(self.game_ids[0])
+        self.assertEqual(await get_redis().ttl(key), -1)  # Not joined yet
+        reaper.unclaimed[self.game_ids[0]] -= reaper.idle_timeout
+        await reaper.reconcile()
+        self.assertGreater(await get_redis().ttl(key), 0)
+
+
+class GamePresenceTest(SimpleTestCase):
+    game_id = 9005
+
+    def tearDown(self):
+        GamePresence._instance = None
+        cache.client.get_client().delete(presence_key(self.game_id))
+
+    async def test_concurrent_joins_get_distinct_counts(self):
+        presence = GamePresence()
+        counts = await asyncio.gather(
+            *(presence.join(self.game_id, f"channel-{i}") for i in range(10))
+        )
+        self.assertEqual(sorted(counts), list(range(1, 11)))
+        self.assertEqual(await presence.join(self.game_id, "channel-0"), 10)
+        self.assertEqual(await presence.leave(self.game_id, "channel-0"), 9)
+        self.assertEqual(await presence.leave(self.game_id, "channel-0"), 9)
+        self.assertEqual(presence.local_count(self.game_id), 9)
+        presence.task.cancel()
+
+    async def test_members_without_heartbeat_expire(self):
+        presence = GamePresence()
+        stale = {"dead-worker-channel": 0}
+        await get_redis().zadd(presence_key(self.game_id), stale)
+        # The stale member is not counted
+        self.assertEqual(await presence.join(self.game_id, "channel"), 1)
+        presence.task.cancel()
+
+
+class HybridChannelLayerTest(SimpleTestCase):
+    group = "game_9004"
+
+    def setUp(self):
+        # Two layers stand for two worker processes sharing one Redis
+        self.layer = HybridChannelLayer(membership_ttl=0)
+        self.other_layer = HybridChannelLayer(membership_ttl=0)
+
+    def tearDown(self):
+        async_to_sync(self.layer.flush)()
+        async_to_sync(self.other_layer.flush)()
+
+    async def test_in_process_members_skip_redis(self):
+        channel = await self.layer.new_channel()
+        await self.layer.group_add(self.group, channel)
+        await self.layer.group_send(self.group, {"type": "test.message", "n": 1})
+        message = await asyncio.wait_for(self.layer.receive(channel), 1)
+        self.assertEqual(message, {"type": "test.message", "n": 1})
+        self.assertEqual(self.layer.stats()["local_deliveries"], 1)
+        self.assertEqual(self.layer.stats()["remote_deliveries"], 0)
+        await self.layer.group_discard(self.group, channel)
+
+    async def test_remote_members_go_through_redis(self):
+        channel = await self.layer.new_channel()
+        other_channel = await self.other_layer.new_channel()
+        await self.layer.group_add(self.group, channel)
+        await self.other_layer.group_add(self.group, other_channel)
+
+        await self.layer.group_send(self.group, {"type": "test.message"})
+        local = await asyncio.wait_for(self.layer.receive(channel), 1)
+        remote = await asyncio.wait_for(self.other_layer.receive(other_channel), 1)
+        self.assertEqual(local, remote)
+        self.assertEqual(self.layer.local_deliveries, 1)
+        self.assertEqual(self.layer.remote_deliveries, 1)
+
+
+@override_settings(
+    PONG_API_WORKERS=["pong-api:8000", "pong-api:8001", "pong-api:8002"],
+    PONG_API_WORKER="pong-api:8000",
+    CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+)
+class ShardingTest(SimpleTestCase):
+    game_id = 9010
+
+    def tearDown(self):
+        sharding.release_worker(self.game_id)
+        cache.delete(f"{self.game_id}")
+        GameStateManager._instances.pop(self.game_id, None)
+
+    def test_ring_spreads_games_and_moves_few_on_resize(self):
+        workers = ["a:8000", "b:8000", "c:8000"]
+        ring = sharding.HashRing(workers)
+        owners = [ring.get(game_id) for game_id in range(3000)]
+        for worker in workers:
+            self.assertGreater(owners.count(worker), 700)
+        grown = sharding.HashRing(workers + ["d:8000"])
+        moved = sum(ring.get(i) != grown.get(i) for i in range(3000))
+        self.assertLess(moved, 1200)
+
+    def test_assignment_is_sticky_and_routed(self):
+        worker = sharding.assign_worker(self.game_id)
+        with override_settings(PONG_API_WORKERS=["pong-api:9000"]):
+            self.assertEqual(sharding.assign_worker(self.game_id), worker)
+        response = self.client.get(f"/game/route/ws/game/{self.game_id}/spectate/")
+        self.assertEqual(response["X-Game-Worker"], worker)
+
+    async def test_rejects_sockets_of_games_hosted_elsewhere(self):
+        RuntimeGameState(id=self.game_id).save()
+        await sharding.get_redis().set(
+            sharding.worker_key(self.game_id), "pong-api:8001"
+        )
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f"/ws/game/{self.game_id}/"
+        )
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+@override_settings(GAME_RESULT_BACKOFF=0, GAME_RESULT_MAX_ATTEMPTS=2)
+class ResultOutboxTest(SimpleTestCase):
+    game_id = 9014
+
+    def tearDown(self):
+        async_to_sync(ResultOutbox().stop)()
+        ResultOutbox._instance = None
+
+    @asynccontextmanager
+    async def matchmaking(self, statuses):
+        """
+        Runs a stand-in matchmaking answering with `statuses` and yields an
+        outbox posting to it, with one result queued and no sender task.
+        """
+        self.requests = []
+
+        async def result(request):
+            self.requests.append(
+                (request.headers.get("Idempotency-Key"), await request.json())
+            )
+            return web.Response(status=statuses.pop(0))
+
+        app = web.Application()
+        app.router.add_post("/api/match/{game_id}/result/", result)
+        server = TestServer(app)
+        await server.start_server()
+        outbox = ResultOutbox()
+        outbox.url = f"http://{server.host}:{server.port}/api/match/{{game_id}}/result/"
+        try:
+            await outbox.enqueue(self.game_id, {"winner_id": 1})
+            await outbox.stop()  # Deliveries are driven by the test
+            yield outbox
+        finally:
+            await outbox.stop()
+            await server.close()
+            redis = get_redis()
+            await redis.delete(result_outbox.result_key(self.game_id))
+            await redis.zrem(result_outbox.OUTBOX_KEY, self.game_id)
+            await redis.zrem(result_outbox.DEAD_LETTERS_KEY, self.game_id)
+
+    async def test_retries_with_the_same_idempotency_key(self):
+        async with self.matchmaking([503, 200]) as outbox:
+            self.assertEqual(await outbox.send_due(), 1)
+            self.assertEqual(await outbox.send_due(), 1)  # No backoff here
+            self.assertEqual(await outbox.send_due(), 0)
+            stored = await get_redis().get(result_outbox.result_key(self.game_id))
+
+        (first_key, body), (second_key, _) = self.requests
+        self.assertEqual(body, {"winner_id": 1})
+        self.assertEqual(first_key, second_key)
+        stats = outbox.stats()
+        self.assertEqual((stats["retried"], stats["delivered"]), (1, 1))
+        self.assertIsNone(stored)
+
+    async def test_rejected_results_are_dead_lettered_and_requeued(self):
+        async with self.matchmaking([400, 200]) as outbox:
+            await outbox.send_due()
+            self.assertEqual(outbox.stats()["dead"], 1)
+            self.assertEqual(await outbox.send_due(), 0)
+
+            self.assertEqual(await outbox.requeue_dead_letters(), 1)
+            await outbox.send_due()
+        self.assertEqual(outbox.stats()["delivered"], 1)
+        self.assertEqual(len(self.requests), 2)
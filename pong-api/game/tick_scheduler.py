@@ -0,0 +1,303 @@
+import asyncio
+import time
+import logging
+import numpy as np
+from django.conf import settings
+from .engine.batch_engine import BatchPongEngine
+from .metrics import TickMetrics
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduledGame:
+    """
+    A game in the tick loop. Its sim_rate and snapshot_rate are turned into
+    physics substeps and frames owed per tick; the fractions are carried
+    over, so e.g. 120 Hz physics with 20 Hz frames on a 40 Hz loop runs 3
+    substeps every tick and sends a frame every other tick.
+    """
+
+    __slots__ = (
+        "manager",
+        "channel_layer",
+        "game_group_name",
+        "spectator_group_name",
+        "substeps",
+        "sends",
+        "sim_credit",
+        "send_credit",
+    )
+
+    def __init__(self, manager, channel_layer, game_group_name):
+        self.manager = manager
+        self.channel_layer = channel_layer
+        self.game_group_name = game_group_name
+        self.spectator_group_name = f"{game_group_name}_spectators"
+        game_state = manager.game_state
+        sim_rate = game_state.sim_rate or settings.GAME_SIM_RATE
+        snapshot_rate = game_state.snapshot_rate or settings.GAME_SNAPSHOT_RATE
+        self.substeps = sim_rate / settings.GAME_TICK_RATE
+        self.sends = min(1.0, snapshot_rate / settings.GAME_TICK_RATE)
+        self.sim_credit = 0.0
+        self.send_credit = 0.0
+
+    def take_substeps(self, ticks):
+        """Physics steps to run for `ticks` elapsed ticks."""
+        self.sim_credit += ticks * self.substeps
+        substeps = int(self.sim_credit)
+        self.sim_credit -= substeps
+        return substeps
+
+    def take_send(self):
+        """Whether a frame is due this tick."""
+        self.send_credit += self.sends
+        if self.send_credit >= 1:
+            self.send_credit -= 1
+            return True
+        return False
+
+
+class TickScheduler:
+    """
+    Advances every registered GameStateManager of this process from a single
+    fixed-timestep loop and batches the resulting broadcasts once per tick.
+
+    Paused and not yet started games are parked once their last frame is
+    sent: they leave `active` and cost nothing per tick until wake() is
+    called for a toggle, move or join. With every game parked the loop
+    waits on an event instead of ticking.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            instance = super(TickScheduler, cls).__new__(cls)
+            instance.__init__()
+            cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "initialized"):
+            return
+        self.tick_rate = settings.GAME_TICK_RATE
+        self.tick_interval = 1 / self.tick_rate
+        self.max_catch_up = settings.GAME_TICK_MAX_CATCH_UP
+        # Spectators get a keyframe every spectator_interval ticks
+        self.spectator_interval = max(
+            1, round(self.tick_rate / settings.GAME_SPECTATOR_RATE)
+        )
+        self.batch_engine = None
+        if settings.GAME_PHYSICS_BACKEND == "batch":
+            if settings.GAME_COLLISION_MODE == "swept":
+                # Swept collisions are only implemented by PongGameEngine
+                logger.warning("Swept collisions use the scalar physics backend")
+            else:
+                self.batch_engine = BatchPongEngine()
+        self.metrics = TickMetrics()
+        self.games = {}
+        self.active = {}
+        # Games changed outside the tick loop since the last batch step
+        self.stale = set()
+        self.woken = asyncio.Event()
+        self.task = None
+        self.ticks = 0
+        self.overruns = 0
+        self.dropped_ticks = 0
+        self.last_tick_duration = 0.0
+        self.max_tick_duration = 0.0
+        self.lag = 0.0
+        self.initialized = True
+
+    def register(self, manager, channel_layer, game_group_name):
+        game = ScheduledGame(manager, channel_layer, game_group_name)
+        self.games[manager.game_id] = self.active[manager.game_id] = game
+        self.woken.set()
+        if self.batch_engine is not None:
+            self.batch_engine.add(manager.game_id, manager.game_state)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+            logger.debug("Started tick scheduler")
+        logger.debug(f"Registered game_id: {manager.game_id} with tick scheduler")
+
+    def unregister(self, manager):
+        self.games.pop(manager.game_id, None)
+        self.active.pop(manager.game_id, None)
+        self.metrics.forget(manager.game_id)
+        if self.batch_engine is not None:
+            self.batch_engine.remove(manager.game_id)
+            self.stale.discard(manager.game_id)
+        logger.debug(f"Unregistered game_id: {manager.game_id} from tick scheduler")
+        if not self.games and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            logger.debug("Stopped tick scheduler, no games left")
+
+    def is_registered(self, manager):
+        # By identity: an evicted manager must not match its replacement
+        game = self.games.get(manager.game_id)
+        return game is not None and game.manager is manager
+
+    def wake(self, game_id):
+        """
+        Puts a parked game back in the tick loop. Called after every toggle,
+        move or join, which with the batch backend also marks the game's
+        slot to be reloaded before the next step.
+        """
+        game = self.games.get(game_id)
+        if game is None:
+            return
+        if self.batch_engine is not None:
+            self.stale.add(game_id)
+        if game_id in self.active:
+            return
+        self.active[game_id] = game
+        self.woken.set()
+        logger.debug("Woke game_id: %s", game_id)
+
+    def is_parked(self, game_id):
+        return game_id in self.games and game_id not in self.active
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        # Bound to the loop running the scheduler
+        self.woken = asyncio.Event()
+        next_tick = loop.time()
+        try:
+            while self.games:
+                if not self.active:
+                    logger.debug("All games parked, tick loop waiting")
+                    self.woken.clear()
+                    await self.woken.wait()
+                    # Time spent parked is not lag
+                    next_tick = loop.time()
+                    continue
+                now = loop.time()
+                if now < next_tick:
+                    await asyncio.sleep(next_tick - now)
+                    now = loop.time()
+
+                # Deadlines are absolute so sleep jitter never accumulates.
+                # When the loop fell behind, physics catches up on the missed
+                # steps (bounded) and everything beyond the bound is dropped.
+                due = int((now - next_tick) / self.tick_interval) + 1
+                steps = min(due, self.max_catch_up)
+                if due > 1:
+                    self.overruns += 1
+                    self.dropped_ticks += due - steps
+                    logger.warning(
+                        "Tick overrun: %s ticks behind, stepping %s", due - 1, steps
+                    )
+                self.lag = now - next_tick
+
+                started = time.perf_counter()
+                try:
+                    await self._tick(steps)
+                except Exception:
+                    # One bad game must not freeze every game on the worker
+                    logger.exception("Tick failed")
+                self.last_tick_duration = time.perf_counter() - started
+                self.max_tick_duration = max(
+                    self.max_tick_duration, self.last_tick_duration
+                )
+                if self.metrics.is_sampled(self.ticks):
+                    self.metrics.observe("tick", self.last_tick_duration)
+                    self.metrics.lag.observe(self.lag)
+                self.ticks += 1
+                next_tick += due * self.tick_interval
+        except asyncio.CancelledError:
+            pass
+        logger.debug("Tick scheduler loop exited")
+
+    async def _tick(self, steps):
+        metrics = self.metrics
+        sampled = metrics.is_sampled(self.ticks)
+        if sampled:
+            started = time.perf_counter()
+
+        games = list(self.active.values())
+        # Moves queued since the last tick are applied once, not per step
+        for game in games:
+            game.manager.apply_inputs()
+        if sampled:
+            inputs_done = time.perf_counter()
+            metrics.observe("inputs", inputs_done - started)
+
+        if self.batch_engine is not None:
+            await self._step_batch(games, steps)
+        else:
+            for game in games:
+                for _ in range(game.take_substeps(steps)):
+                    if game.manager.game_state.is_game_ended:
+                        break
+                    await game.manager.update_game_state()
+        if sampled:
+            update_done = time.perf_counter()
+            metrics.observe("update", update_done - inputs_done)
+
+        broadcasts = []
+        for game in games:
+            # Changes accumulate in the dirty mask until a frame is due. The
+            # final state of an ended game is always sent.
+            if not game.take_send() and not game.manager.game_state.is_game_ended:
+                continue
+            message = await game.manager.build_partial_game_state()
+            if message is not None:
+                metrics.count_frame(game.manager.game_id, message)
+                broadcasts.append(
+                    game.channel_layer.group_send(game.game_group_name, message)
+                )
+        if self.ticks % self.spectator_interval == 0:
+            for game in games:
+                if game.manager.spectators:
+                    message = await game.manager.build_snapshot(timestamp=True)
+                    broadcasts.append(
+                        game.channel_layer.group_send(
+                            game.spectator_group_name, message
+                        )
+                    )
+        if sampled:
+            encode_done = time.perf_counter()
+            metrics.observe("encode", encode_done - update_done)
+
+        if broadcasts:
+            results = await asyncio.gather(*broadcasts, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error broadcasting game state: {result}")
+        if sampled:
+            metrics.observe("fanout", time.perf_counter() - encode_done)
+
+        for game in games:
+            if game.manager.game_state.is_game_ended:
+                # After the final score went out
+                await game.manager.end_game(game.channel_layer, game.game_group_name)
+            if game.manager.is_idle():
+                del self.active[game.manager.game_id]
+                logger.debug("Parked game_id: %s", game.manager.game_id)
+
+    async def _step_batch(self, games, steps):
+        # The engine's arrays hold the scheduled games, only the values a
+        # step changed are written back. No awaits from here on: moves and
+        # toggles cannot interleave, so the manager locks are not needed.
+        engine = self.batch_engine
+        for game_id in self.stale:
+            engine.load(game_id, self.games[game_id].manager.game_state)
+        self.stale.clear()
+        substeps = np.zeros(len(engine), dtype=np.int64)
+        for game in games:
+            substeps[engine.slots[game.manager.game_id]] = game.take_substeps(steps)
+        engine.step_many(substeps)
+
+    def stats(self):
+        return {
+            "tick_rate": self.tick_rate,
+            "games": len(self.games),
+            "parked": len(self.games) - len(self.active),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "dropped_ticks": self.dropped_ticks,
+            "lag": self.lag,
+            "last_tick_duration": self.last_tick_duration,
+            "max_tick_duration": self.max_tick_duration,
+        }
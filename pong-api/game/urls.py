@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
@@ -8,4 +8,10 @@ urlpatterns = [
         "get_game_state/<int:id>/", views.GetGameState.as_view(), name="get_game_state"
     ),
     path("delete_game/<int:id>/", views.DeleteGame.as_view(), name="delete_game"),
+    path("metrics/", views.game_metrics, name="game_metrics"),
+    path("trace_game/<int:id>/", views.TraceGame.as_view(), name="trace_game"),
+    # Takes the original socket path, e.g. route/ws/game/42/spectate/
+    re_path(
+        r"^route/ws/game/(?P<id>[0-9]+)/", views.GameRoute.as_view(), name="game_route"
+    ),
 ]
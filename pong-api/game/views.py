@@ -1,5 +1,6 @@
 import json
 from rest_framework import generics, serializers
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework.response import Response
 from rest_framework import status
@@ -7,6 +8,9 @@ from django.core.cache import cache
 from django.conf import settings
 from .serializers import GameStateSerializer
 from .models import GameState
+from . import metrics
+from . import sharding
+from .engine import tracing
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,6 +33,7 @@ class CreateGame(generics.CreateAPIView):
             )
         logger.info(f"Game with ID: {cache_key} created in db.")
         game_state = serializer.save()
+        game_state.worker = sharding.assign_worker(game_id)
         return game_state
 
     def create(self, request, *args, **kwargs):
@@ -37,7 +42,7 @@ class CreateGame(generics.CreateAPIView):
         game_state = self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
         return Response(
-            GameStateSerializer(game_state).data,
+            {**GameStateSerializer(game_state).data, "worker": game_state.worker},
             status=status.HTTP_201_CREATED,
             headers=headers,
         )
@@ -80,6 +85,7 @@ class DeleteGame(generics.DestroyAPIView):
             game_state = get_object_or_404(GameState, id=game_id)
 
         cache.delete(f"game_state:{game_id}")
+        sharding.release_worker(game_id)
         # Delete from database
         game_state.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -107,3 +113,52 @@ class GetGameState(generics.RetrieveAPIView):
             return GameState(**game_state)
         else:
             return super().get_object()
+
+
+class TraceGame(generics.GenericAPIView):
+    """
+    Turns engine tracing of one game on (POST) or off (DELETE) at runtime.
+    Tracing lives in the memory of the worker hosting the game, requests
+    reaching another worker get a 409 naming the right one.
+    """
+
+    def post(self, request, *args, **kwargs):
+        return self.set_tracing(kwargs["id"], True)
+
+    def delete(self, request, *args, **kwargs):
+        return self.set_tracing(kwargs["id"], False)
+
+    def set_tracing(self, game_id, enabled):
+        worker = sharding.get_worker(game_id)
+        if sharding.is_sharded() and worker != settings.PONG_API_WORKER:
+            return Response({"worker": worker}, status=status.HTTP_409_CONFLICT)
+        if enabled:
+            tracing.enable(game_id)
+        else:
+            tracing.disable(game_id)
+        logger.info(
+            f"Tracing {'enabled' if enabled else 'disabled'} for game {game_id}"
+        )
+        return Response({"game_id": game_id, "tracing": enabled})
+
+
+class GameRoute(generics.GenericAPIView):
+    """
+    Tells which worker hosts a game. nginx calls it through auth_request with
+    the original WebSocket path and proxies the socket to the X-Game-Worker
+    header of the response.
+    """
+
+    def get(self, request, *args, **kwargs):
+        worker = sharding.get_worker(kwargs["id"])
+        return Response({"worker": worker}, headers={"X-Game-Worker": worker})
+
+
+async def game_metrics(request):
+    """
+    Prometheus text exposition of this worker's game loop. Async so it reads
+    the live game objects on the event loop that mutates them.
+    """
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -197,13 +197,66 @@ ASGI_APPLICATION = "pongApi.asgi.application"
 
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        # Redis layer that delivers to members of this process in memory
+        "BACKEND": "game.channel_layers.HybridChannelLayer",
         "CONFIG": {
             "hosts": [("localhost", 6379)],
             "capacity": 10000,
             "expiry": 2,
+            "membership_ttl": 1,  # Seconds between reads of remote members
         },
     }
 }
 
 USE_REDIS = True
+
+# Game loop: every game of this process is advanced by one shared scheduler
+GAME_TICK_RATE = 40  # Ticks per second
+GAME_TICK_MAX_CATCH_UP = 5  # Max physics steps run for one late tick
+# "scalar" steps each game with PongGameEngine, "batch" steps all games at
+# once with the NumPy BatchPongEngine
+GAME_PHYSICS_BACKEND = "scalar"
+# "discrete" tests collisions at the ball position after each physics step,
+# "swept" tests the ball's whole path and reflects it at the time of impact
+# (scalar backend only)
+GAME_COLLISION_MODE = "discrete"
+# Per-game defaults, games can override them with sim_rate / snapshot_rate.
+# Physics runs sim_rate / GAME_TICK_RATE substeps per tick, and a frame is
+# broadcast snapshot_rate times per second (at most once per tick)
+GAME_SIM_RATE = GAME_TICK_RATE  # Physics steps per second
+GAME_SNAPSHOT_RATE = GAME_TICK_RATE  # Frames per second sent to players
+GAME_MAX_SIM_RATE = 480
+GAME_KEYFRAME_INTERVAL = 80  # Frames between full-state keyframes
+# "positions" sends the ball position whenever it moves, "trajectory" only
+# sends the ball's path when it changes and clients extrapolate it
+GAME_BALL_UPDATES = "positions"
+GAME_SPECTATOR_RATE = 10  # Spectator keyframes per second
+GAME_INPUT_MAX_STEPS_PER_TICK = 1  # Paddle steps a player can move per tick
+GAME_INPUT_RATE = 150  # Messages per second a game socket may send on average
+GAME_INPUT_BURST = 50  # Messages a game socket may send at once
+GAME_INPUT_MAX_DROPS = 500  # Rate-limited messages before the socket is closed
+GAME_MAX_MESSAGE_SIZE = 1024  # Largest accepted client message, in bytes
+GAME_METRICS_SAMPLE_INTERVAL = 10  # Ticks between timed ticks, 0 disables timing
+
+# Async Redis client used by the game loop, same database as the cache
+GAME_REDIS_URL = CACHES["default"]["LOCATION"]
+GAME_PRESENCE_TTL = 30  # Seconds before a member without heartbeat expires
+GAME_CHECKPOINT_INTERVAL = 2  # Seconds between checkpoints of live games
+GAME_REAPER_INTERVAL = 30  # Seconds between sweeps of ended and idle games
+GAME_IDLE_TIMEOUT = 300  # Seconds without clients before a game is evicted
+GAME_MAX_LIVE_GAMES = 1000  # Games kept in memory by one worker
+GAME_ABANDONED_TTL = 3600  # Seconds an evicted game's state stays in Redis
+
+# Game results are queued in Redis and POSTed to matchmaking in the background
+GAME_RESULT_URL = "http://matchmaking:8000/api/match/{game_id}/result/"
+GAME_RESULT_TIMEOUT = 5  # Seconds before a delivery attempt is abandoned
+GAME_RESULT_MAX_ATTEMPTS = 8  # Attempts before a result is dead-lettered
+GAME_RESULT_BACKOFF = 1  # Seconds before the first retry, doubled per attempt
+GAME_RESULT_MAX_BACKOFF = 300  # Longest wait between two attempts
+GAME_RESULT_LEASE = 30  # Seconds a claimed result is reserved to its sender
+GAME_RESULT_POLL_INTERVAL = 5  # Seconds between checks for results to send
+
+# Sharding: games are placed on the "host:port" workers below by consistent
+# hashing on game_id and every socket of a game is routed to its worker
+PONG_API_WORKERS = os.environ.get("PONG_API_WORKERS", "pong-api:8000").split(",")
+PONG_API_WORKER = os.environ.get("PONG_API_WORKER", PONG_API_WORKERS[0])